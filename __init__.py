@@ -26,7 +26,7 @@ bl_info = {
 
 import bpy
 
-from .pbaker_bake import PBAKER_OT_bake
+from .pbaker_bake import PBAKER_OT_bake, PBAKER_OT_bake_modal, PBAKER_OT_bake_preview, PBAKER_OT_check_changes
 from .pbaker_list import *
 from .pbaker_prefs import PBAKER_prefs
 from .pbaker_preset import *
@@ -37,10 +37,15 @@ if bpy.app.version_string.startswith('2.8'):
 
    classes = (
       PBAKER_OT_bake,
+      PBAKER_OT_bake_modal,
+      PBAKER_OT_bake_preview,
+      PBAKER_OT_check_changes,
       PBAKER_prefs,
       PBAKER_settings,
       PBAKER_UL_List,
       PBAKER_ListItem,
+      PBAKER_DirtyJob,
+      PBAKER_QueueItem,
       PBAKER_BAKELIST_OT_Init,
       PBAKER_BAKELIST_OT_Update,
       PBAKER_BAKELIST_OT_Delete,
@@ -68,11 +73,16 @@ else:
 
    classes = (
       PBAKER_OT_bake,
+      PBAKER_OT_bake_modal,
+      PBAKER_OT_bake_preview,
+      PBAKER_OT_check_changes,
       PBAKER_PT_panel,
       PBAKER_prefs,
       PBAKER_settings,
       PBAKER_UL_List,
       PBAKER_ListItem,
+      PBAKER_DirtyJob,
+      PBAKER_QueueItem,
       PBAKER_BAKELIST_OT_Init,
       PBAKER_BAKELIST_OT_Update,
       PBAKER_BAKELIST_OT_Delete,
@@ -92,6 +102,9 @@ def register():
    bpy.types.Scene.principled_baker_settings = bpy.props.PointerProperty(type=PBAKER_settings)
    bpy.types.Scene.principled_baker_bakelist = bpy.props.CollectionProperty(type = PBAKER_ListItem)
    bpy.types.Scene.principled_baker_bakelist_index = bpy.props.IntProperty(name="Bakelist Index", default = 0)
+   bpy.types.Scene.principled_baker_dirty_jobs = bpy.props.CollectionProperty(type = PBAKER_DirtyJob)
+   bpy.types.Scene.principled_baker_queue = bpy.props.CollectionProperty(type = PBAKER_QueueItem)
+   bpy.types.Scene.principled_baker_queue_status = bpy.props.StringProperty(name="Bake Queue Status")
 
     
 def unregister():
@@ -100,6 +113,9 @@ def unregister():
    
    del bpy.types.Scene.principled_baker_settings
    del bpy.types.Scene.principled_baker_bakelist_index
+   del bpy.types.Scene.principled_baker_dirty_jobs
+   del bpy.types.Scene.principled_baker_queue
+   del bpy.types.Scene.principled_baker_queue_status
 
 
 if __name__ == "__main__":
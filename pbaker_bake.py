@@ -1,11 +1,14 @@
 import hashlib
 import os
 import pathlib
+import shutil
+import tempfile
 import time
 
 import bpy
 from mathutils import Color
 
+from .pbaker_exr import EXR_COMPRESSIONS, MultiPartExrLayer, MultiPartExrWriter
 from .pbaker_functions import *
 
 
@@ -17,7 +20,16 @@ class PBAKER_OT_bake(bpy.types.Operator):
 
     def extend_joblist(self, joblist):
         if self.settings.use_Diffuse:
-            if "Diffuse" not in joblist:
+            if self.settings.use_diffuse_components:
+                # composed from components - see create_diffuse_image()
+                if "Diffuse" in joblist:
+                    joblist.remove("Diffuse")
+                passes = set(p for job_name in self.get_diffuse_jobs()
+                             for p in self.get_diffuse_passes(job_name))
+                for p in ['DIRECT', 'INDIRECT', 'COLOR']:
+                    if p in passes and DIFFUSE_COMPONENTS[p] not in joblist:
+                        joblist.append(DIFFUSE_COMPONENTS[p])
+            elif "Diffuse" not in joblist:
                 joblist.append("Diffuse")
         if self.settings.use_invert_roughness:
             if "Glossiness" not in joblist:
@@ -25,12 +37,20 @@ class PBAKER_OT_bake(bpy.types.Operator):
         if self.settings.use_Bump:
             if "Bump" not in joblist:
                 joblist.append("Bump")
+            # derived from Bump - see create_normal_from_bump()
+            if self.settings.use_normal_from_bump and "Normal" in joblist:
+                joblist.remove("Normal")
         if self.settings.use_material_id:
             if "MatID" not in joblist:
                 joblist.append("MatID")
         if self.settings.use_wireframe:
             if "Wireframe" not in joblist:
                 joblist.append("Wireframe")
+        # derived from Normal - see create_curvature_image()
+        if self.settings.use_curvature or self.settings.use_cavity:
+            if "Normal" not in joblist and not (
+                    self.settings.use_Bump and self.settings.use_normal_from_bump):
+                joblist.append("Normal")
 
     def get_suffix(self, input_name):
         bakelist = bpy.context.scene.principled_baker_bakelist
@@ -47,6 +67,17 @@ class PBAKER_OT_bake(bpy.types.Operator):
             suffix = self.settings.suffix_material_id
         elif input_name == 'Wireframe':
             suffix = self.settings.suffix_wireframe
+        elif input_name == 'Curvature':
+            suffix = self.settings.suffix_curvature
+        elif input_name == 'Cavity':
+            suffix = self.settings.suffix_cavity
+        elif input_name in NORMAL_VARIANT_JOBS:
+            job_name, convention = NORMAL_VARIANT_JOBS[input_name]
+            suffix = self.get_suffix(job_name) + NORMAL_CONVENTIONS[convention][1]
+        elif input_name in DIFFUSE_COMPONENT_JOBS:
+            suffix = self.settings.suffix_diffuse + "_" + DIFFUSE_COMPONENT_JOBS[input_name].title()
+        elif input_name in DIFFUSE_VARIANT_JOBS:
+            suffix = self.settings.suffix_diffuse + "_" + DIFFUSE_VARIANT_JOBS[input_name].title()
         else:
             suffix = bakelist[input_name]['suffix']
 
@@ -64,12 +95,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 delete_tagged_nodes(mat_slot.material, NODE_TAG)
 
     def delete_tagged_materials(self, obj, tag):
-        for mat_index in range(0, len(obj.material_slots)):
-            mat_slot = obj.material_slots[mat_index]
-            if mat_slot.material:
-                if tag in mat_slot.material.keys():
-                    bpy.context.object.active_material_index = mat_index
-                    bpy.ops.object.material_slot_remove({'object': obj})
+        remove_tagged_materials(obj, tag)
 
     def disable_material_outputs(self, obj):
         for mat_slot in obj.material_slots:
@@ -110,7 +136,15 @@ class PBAKER_OT_bake(bpy.types.Operator):
         bake_image_node.select = True
         mat.node_tree.nodes.active = bake_image_node
 
-    def save_image(self, image):
+    def save_image(self, image, job_name=None):
+        if self.settings.file_format == 'DDS':
+            save_image_as_dds(image,
+                              file_path=image.filepath,
+                              dds_format=get_dds_format(job_name, self.settings.color_mode),
+                              quality=self.settings.dds_quality == 'QUALITY',
+                              mip_job_name=job_name if self.settings.use_mipmaps else None)
+            self.output_index.update(bpy.path.basename(image.filepath))
+            return
         save_image_as(image,
                       file_path=image.filepath,
                       file_format=self.settings.file_format,
@@ -120,6 +154,35 @@ class PBAKER_OT_bake(bpy.types.Operator):
                       quality=self.settings.quality,
                       tiff_codec=self.settings.tiff_codec,
                       exr_codec=self.settings.exr_codec)
+        self.output_index.update(bpy.path.basename(image.filepath))
+        if self.settings.use_mipmaps:
+            self.save_mipmaps(image, job_name)
+
+    def save_mipmaps(self, image, job_name):
+        """write mipmaps next to image as <name>_mip<level>"""
+        width, height = image.size
+        rows = get_image_pixels(image).reshape(height, width, 4)
+        srgb = not image.is_float and image.colorspace_settings.name == 'sRGB'
+        root, ext = os.path.splitext(image.filepath)
+        for level, mip in enumerate(get_mip_chain(rows, job_name, srgb), 1):
+            file_path = "{0}_mip{1}{2}".format(root, level, ext)
+            mip_image = bpy.data.images.new(
+                name=bpy.path.basename(file_path),
+                width=mip.shape[1], height=mip.shape[0],
+                alpha=self.settings.color_mode == 'RGBA', float_buffer=image.is_float)
+            mip_image.colorspace_settings.name = image.colorspace_settings.name
+            set_image_pixels(mip_image, mip.reshape(-1, 4))
+            save_image_as(mip_image,
+                          file_path=file_path,
+                          file_format=self.settings.file_format,
+                          color_mode=self.settings.color_mode,
+                          color_depth=self.settings.color_depth,
+                          compression=self.settings.compression,
+                          quality=self.settings.quality,
+                          tiff_codec=self.settings.tiff_codec,
+                          exr_codec=self.settings.exr_codec)
+            self.output_index.update(bpy.path.basename(file_path))
+            bpy.data.images.remove(mip_image)
 
     def new_material(self, name):
         mat = bpy.data.materials.new(name)
@@ -154,36 +217,49 @@ class PBAKER_OT_bake(bpy.types.Operator):
         """returns dictionary with equal node values in all materials in all objects, eg. metal, roughness"""
 
         n_pri_node_settings = {}
+        if not (self.settings.make_new_material or self.settings.bake_mode == 'SELECTED_TO_ACTIVE'):
+            return n_pri_node_settings
+
+        # one traversal per material
+        material_value_tables = {}
         for obj in objs:
-            for value_name in NODE_INPUTS:
-                if value_name not in ['Subsurface Radius', 'Normal', 'Clearcoat Normal', 'Tangent']:
-                    value_list = []
-                    for mat_slot in obj.material_slots:
-                        if mat_slot.material:
-                            mat = mat_slot.material
-                            if not MATERIAL_TAG in mat.keys():
-                                material_output = get_active_output(mat)
-                                tmp_val_list = self.get_value_list(
-                                    material_output, value_name)
-                                value_list.extend(tmp_val_list)
-
-                    if value_list:
-                        if is_list_equal(value_list):
-                            if self.settings.make_new_material or self.settings.bake_mode == 'SELECTED_TO_ACTIVE':
-                                n_pri_node_settings[value_name] = value_list[0]
+            value_tables = []
+            for mat_slot in obj.material_slots:
+                if mat_slot.material:
+                    mat = mat_slot.material
+                    if not MATERIAL_TAG in mat.keys():
+                        if mat.name not in material_value_tables:
+                            material_output = get_active_output(mat)
+                            material_value_tables[mat.name] = get_value_table(
+                                material_output, exclude_node_types=['NORMAL_MAP'])
+                        value_tables.append(material_value_tables[mat.name])
+
+            value_table = merge_value_tables(value_tables)
+            for value_name in VALUE_INPUTS:
+                values = value_table.get(value_name)
+                if values and is_value_list_equal(values):
+                    n_pri_node_settings[value_name] = get_default_value(
+                        values[0])
         return n_pri_node_settings
 
-    def add_images_to_material(self, new_mat, new_images):
+    def add_images_to_material(self, new_mat, new_images, uv_map=None):
+        """uv_map: name of the UV map of the images, else the active render UV map"""
 
         NOT_TO_LINK_NODES = ["Glossiness", "Ambient Occlusion",
-                             "Vertex_Color", "MatID", "Diffuse", "Wireframe"]
+                             "Vertex_Color", "MatID", "Diffuse", "Wireframe"] + \
+            list(DIFFUSE_COMPONENT_JOBS) + list(DIFFUSE_VARIANT_JOBS)
 
         principled_node = find_node_by_type(new_mat, 'BSDF_PRINCIPLED')
         material_output = find_node_by_type(new_mat, 'OUTPUT_MATERIAL')
 
         if new_images:
-            tex_coord_node = new_mat.node_tree.nodes.new(
-                type="ShaderNodeTexCoord")
+            if uv_map:
+                tex_coord_node = new_mat.node_tree.nodes.new(
+                    type="ShaderNodeUVMap")
+                tex_coord_node.uv_map = uv_map
+            else:
+                tex_coord_node = new_mat.node_tree.nodes.new(
+                    type="ShaderNodeTexCoord")
             mapping_node = new_mat.node_tree.nodes.new(
                 type="ShaderNodeMapping")
             new_mat.node_tree.links.new(
@@ -384,6 +460,16 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 new_mat.node_tree.links.new(image_node.outputs['Color'],
                                             principled_node.inputs[name])
 
+        # uniform images -> input values
+        for name, color in self.uniform_values.items():
+            if name == 'Color':
+                name = 'Base Color'
+            socket = principled_node.inputs[name]
+            if socket.type == 'RGBA':
+                socket.default_value = color[0:3] + [1.0]
+            else:
+                socket.default_value = color[0]
+
     def new_pb_emission_node(self, material, color=[0, 0, 0, 1]):
         node = material.node_tree.nodes.new(type='ShaderNodeEmission')
         node.inputs['Color'].default_value = color  # [0, 0, 0, 1]
@@ -396,17 +482,22 @@ class PBAKER_OT_bake(bpy.types.Operator):
         node[NODE_TAG] = 1
         return node
 
-    def is_image_file(self, image_file_name):
-        cwd = os.path.normpath(os.path.dirname(bpy.data.filepath))
-        abs_path = os.path.normpath(self.get_image_file_path(image_file_name))
-        if not os.path.isabs(abs_path):
-            abs_path = os.path.normpath(cwd + abs_path)
-        return os.path.isfile(abs_path)
+    def is_image_file(self, image_file_name, resolve_alias=True):
+        if self.output_index.is_file(image_file_name):
+            return True
+        # identical image saved under another name
+        if resolve_alias and image_file_name in self.image_aliases:
+            return self.is_image_file(self.image_aliases[image_file_name], False)
+        return False
 
-    def get_image_file_name(self, object_name, job_name):
+    def get_image_prefix(self, object_name):
         prefix = self.settings.image_prefix
         if prefix == "" or len(self.selected_objects) > 1 or self.settings.use_object_name:
             prefix = self.settings.image_prefix + object_name
+        return prefix
+
+    def get_image_file_name(self, object_name, job_name):
+        prefix = self.get_image_prefix(object_name)
         image_file_format = IMAGE_FILE_FORMAT_ENDINGS[self.settings.file_format]
         image_file_name = "{0}{1}.{2}".format(
             prefix, self.get_suffix(job_name), image_file_format)
@@ -428,6 +519,9 @@ class PBAKER_OT_bake(bpy.types.Operator):
         return path
 
     def load_image(self, image_file_name):
+        if image_file_name in self.image_aliases:
+            if not self.is_image_file(image_file_name, False):
+                image_file_name = self.image_aliases[image_file_name]
         if image_file_name in bpy.data.images:
             image = bpy.data.images[image_file_name]
         else:
@@ -435,7 +529,8 @@ class PBAKER_OT_bake(bpy.types.Operator):
             image = bpy.data.images.load(path)
         return image
 
-    def new_bake_image(self, object_name, job_name):
+    def new_bake_image(self, object_name, job_name, tile=None, resolution=None):
+        """tile: UDIM tile, saved as <name>.<tile>.<ext>"""
         if self.settings.bake_mode == 'BATCH':
             prefix = self.settings.image_prefix + object_name
         else:
@@ -450,6 +545,8 @@ class PBAKER_OT_bake(bpy.types.Operator):
         file_format = IMAGE_FILE_FORMAT_ENDINGS[self.settings.file_format]
         name = "{0}{1}.{2}".format(prefix, self.get_suffix(
             job_name), file_format)  # include ending
+        if tile:
+            name = get_udim_file_path(name, tile)
         path = self.get_image_file_path(name)
 
         # alpha
@@ -462,8 +559,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
             job_name) == 'NORMAL' else (0.0, 0.0, 0.0, 1.0)
 
         # resolution
-        res = int(self.settings.custom_resolution) if self.settings.resolution == 'CUSTOM' else int(
-            self.settings.resolution)
+        res = resolution if resolution else self.get_resolution()
 
         is_float = False if self.settings.color_depth == '8' else True
 
@@ -471,7 +567,8 @@ class PBAKER_OT_bake(bpy.types.Operator):
             name=name, width=res, height=res, alpha=alpha, float_buffer=is_float)
 
         image.colorspace_settings.name = 'sRGB' if job_name in [
-            'Color', 'Diffuse'] else 'Non-Color'
+            'Color', 'Diffuse'] or job_name in DIFFUSE_COMPONENT_JOBS or \
+            job_name in DIFFUSE_VARIANT_JOBS else 'Non-Color'
         image.generated_color = color
         image.generated_type = 'BLANK'
         # 2.79
@@ -481,14 +578,160 @@ class PBAKER_OT_bake(bpy.types.Operator):
 
         return image
 
-    def create_gloss_image(self, obj_name, img):
-        img_name = self.get_image_file_name(obj_name, "Glossiness")
+    def get_resolution(self):
+        return int(self.settings.custom_resolution) if self.settings.resolution == 'CUSTOM' else int(
+            self.settings.resolution)
+
+    def new_derived_image(self, obj_name, job_name, size):
+        img_name = self.get_image_file_name(obj_name, job_name)
         if img_name in bpy.data.images:
             bpy.data.images.remove(bpy.data.images[img_name])
-        gloss_image = self.new_bake_image(obj_name, "Glossiness")
-        gloss_image.filepath = self.get_image_file_path(img_name)
+        image = self.new_bake_image(obj_name, job_name)
+        image.filepath = self.get_image_file_path(img_name)
+        if image.size[:] != size[:]:
+            image.scale(size[0], size[1])
+        return image
+
+    def save_derived_image(self, image, job_name):
+        """returns image or None, if it is uniform or a duplicate"""
+        if self.check_uniform_image(image, job_name):
+            return
+        if self.check_duplicate_image(image, job_name):
+            bpy.data.images.remove(image)
+            return
+        if self.use_exr_bundle():
+            return image
+        self.save_image(image, job_name)
+        self.image_aliases.pop(bpy.path.basename(image.filepath), None)
+        self.record_fingerprint(image)
+        return image
+
+    def create_gloss_image(self, obj_name, img):
+        gloss_image = self.new_derived_image(obj_name, "Glossiness", img.size)
+        gloss_image.generated_color = (1.0, 1.0, 1.0, 1.0)  # inverted fill color
         gloss_image.pixels = get_invert_image(img)
-        self.save_image(gloss_image)
+        return self.save_derived_image(gloss_image, "Glossiness")
+
+    def create_normal_from_bump(self, obj_name, img):
+        """Normal from the baked Bump height instead of a second bake"""
+        normal_image = self.new_derived_image(obj_name, "Normal", img.size)
+        pixels = get_image_pixels(img)
+        mask = self.get_coverage_mask(img)
+        normals = get_normal_from_height(pixels, img.size[0], img.size[1], mask,
+                                         self.settings.normal_from_bump_strength)
+        set_image_pixels(normal_image, convert_normal_pixels(
+            normals, NORMAL_CONVENTIONS['OPENGL'][2], self.get_normal_axes(), renormalize=False))
+        return self.save_derived_image(normal_image, "Normal")
+
+    def move_derived_jobs(self, new_images, derived_images):
+        """derived images, which replace a bake job, go to the new material"""
+        if self.settings.use_Bump and self.settings.use_normal_from_bump:
+            if "Normal" in derived_images:
+                new_images["Normal"] = derived_images.pop("Normal")
+
+    def get_normal_axes(self):
+        """axes of R, G and B of baked normal maps"""
+        return (self.render_settings.normal_r, self.render_settings.normal_g,
+                self.render_settings.normal_b)
+
+    def create_normal_variant(self, obj_name, job_name, convention, img):
+        """normal map in another convention, converted from the baked one"""
+        variant_name = "{0} {1}".format(job_name, NORMAL_CONVENTIONS[convention][0])
+        variant_image = self.new_derived_image(obj_name, variant_name, img.size)
+        variant_image.generated_color = img.generated_color
+        set_image_pixels(variant_image, convert_normal_pixels(
+            get_image_pixels(img), self.get_normal_axes(), NORMAL_CONVENTIONS[convention][2],
+            self.settings.use_normal_renormalize, self.settings.use_normal_reconstruct_z))
+        return self.save_derived_image(variant_image, variant_name)
+
+    def create_curvature_image(self, obj_name, job_name, img):
+        """Curvature or Cavity from the divergence of the baked normals"""
+        pixels = get_image_pixels(img)
+        mask = self.get_coverage_mask(img)
+        normals = convert_normal_pixels(pixels, self.get_normal_axes(),
+                                        NORMAL_CONVENTIONS['OPENGL'][2], renormalize=False)
+        image = self.new_derived_image(obj_name, job_name, img.size)
+        image.generated_color = (0.5, 0.5, 0.5, 1.0) if job_name == 'Curvature' else (
+            1.0, 1.0, 1.0, 1.0)
+        set_image_pixels(image, get_curvature_pixels(
+            normals, img.size[0], img.size[1], mask, job_name == 'Cavity',
+            self.settings.curvature_strength, self.settings.curvature_radius))
+        return self.save_derived_image(image, job_name)
+
+    def get_diffuse_jobs(self):
+        """diffuse outputs, composed from the components"""
+        return ["Diffuse"] + [DIFFUSE_VARIANTS[v][0] for v in sorted(self.settings.diffuse_variants)]
+
+    def get_diffuse_passes(self, job_name):
+        if job_name in DIFFUSE_VARIANT_JOBS:
+            return DIFFUSE_VARIANTS[DIFFUSE_VARIANT_JOBS[job_name]][1]
+        return [p for p, use in [('DIRECT', self.render_settings.use_pass_direct),
+                                 ('INDIRECT', self.render_settings.use_pass_indirect),
+                                 ('COLOR', self.render_settings.use_pass_color)] if use]
+
+    def create_diffuse_image(self, obj_name, job_name, component_images):
+        """Diffuse or a variant, composed from the baked components"""
+        img = component_images[0]
+        components = dict(zip(self.get_diffuse_passes(job_name), component_images))
+        pixels = get_diffuse_pixels(*[get_image_pixels(components[p]) if p in components else None
+                                      for p in ['DIRECT', 'INDIRECT', 'COLOR']],
+                                    srgb=not img.is_float)
+        image = self.new_derived_image(obj_name, job_name, img.size)
+        # all baked pixels of all components, also unlit ones
+        mask = self.get_coverage_mask(img)
+        pixels[~mask] = image.generated_color[:]
+        set_image_pixels(image, pixels)
+        return self.save_derived_image(image, job_name)
+
+    def merge_alpha_to_color(self, color_image, alpha_image):
+        color_image.pixels = get_combined_images(color_image, alpha_image, 0, 3)
+        if self.use_exr_bundle():
+            return color_image
+        self.save_image(color_image, "Color")
+        self.record_fingerprint(color_image)
+        return color_image
+
+    def get_post_process_graph(self, object_name):
+        """derived outputs, which run once after all jobs of object_name are baked"""
+        graph = PostProcessGraph()
+        if self.settings.use_invert_roughness:
+            graph.add("Glossiness", ["Roughness"],
+                      lambda image: self.create_gloss_image(object_name, image))
+        if self.settings.use_alpha_to_color and self.settings.color_mode == 'RGBA':
+            graph.add("Color", ["Color", "Alpha"], self.merge_alpha_to_color)
+        if self.settings.use_Bump and self.settings.use_normal_from_bump:
+            graph.add("Normal", ["Bump"],
+                      lambda image: self.create_normal_from_bump(object_name, image))
+        for variant_name, (job_name, convention) in sorted(NORMAL_VARIANT_JOBS.items()):
+            if convention in self.settings.normal_variants:
+                graph.add(variant_name, [job_name],
+                          lambda image, job_name=job_name, convention=convention:
+                          self.create_normal_variant(object_name, job_name, convention, image))
+        if self.settings.use_Diffuse and self.settings.use_diffuse_components:
+            for job_name in self.get_diffuse_jobs():
+                passes = self.get_diffuse_passes(job_name)
+                if passes:
+                    graph.add(job_name, [DIFFUSE_COMPONENTS[p] for p in passes],
+                              lambda *images, job_name=job_name:
+                              self.create_diffuse_image(object_name, job_name, images))
+        if self.settings.use_denoise:
+            for job_name in DENOISE_JOBS:
+                graph.add(job_name, [job_name],
+                          lambda image, normal_image, job_name=job_name:
+                          self.denoise_image(job_name, image, normal_image),
+                          optional_inputs=["Normal"])
+        for job_name in ["Curvature", "Cavity"]:
+            if getattr(self.settings, "use_" + job_name.lower()):
+                graph.add(job_name, ["Normal"],
+                          lambda image, job_name=job_name:
+                          self.create_curvature_image(object_name, job_name, image))
+
+        # derived outputs read and write whole images, not UDIM tiles
+        if self.settings.use_udim and graph.nodes:
+            self.report({'INFO'}, "UDIM Tiles: '{0}' not created.".format(
+                "', '".join(sorted(set(node[0] for node in graph.nodes)))))
+            return PostProcessGraph()
+        return graph
 
     def can_bake(self, objects):
         for obj in objects:
@@ -510,6 +753,12 @@ class PBAKER_OT_bake(bpy.types.Operator):
                         self.report(
                             {'INFO'}, "baking cancelled. '{0}' UV map missing.".format(obj.name))
                         return False
+            # no space for atlas UV map?
+            if self.settings.bake_mode == 'ATLAS':
+                if ATLAS_UV_NAME not in obj.data.uv_layers and len(obj.data.uv_layers) >= MAX_UV_MAPS:
+                    self.report(
+                        {'INFO'}, "baking cancelled. '{0}' has no space for UV map '{1}'.".format(obj.name, ATLAS_UV_NAME))
+                    return False
             # has vertex color?
             if not self.settings.bake_mode == 'BATCH':
                 if self.settings.use_vertex_color and len(obj.data.vertex_colors) == 0:
@@ -744,29 +993,52 @@ class PBAKER_OT_bake(bpy.types.Operator):
             if NODE_TAG in node.keys():
                 node.parent = p_baker_frame
 
-    def get_value_list(self, node, value_name):
-        value_list = []
+    def prepare_material_for_multiplexed_jobs(self, mat, job_names):
+        """link up to 3 scalar inputs via Combine RGB to R, G and B of temp emission node"""
 
-        def find_values(node, value_name):
-            if not node.type == 'NORMAL_MAP':
-                if value_name == 'Color' and node.type == 'BSDF_PRINCIPLED':
-                    tmp_value_name = 'Base Color'
-                else:
-                    tmp_value_name = value_name
-                if tmp_value_name in node.inputs.keys():
-                    if node.inputs[tmp_value_name].type == 'RGBA':
-                        [r, g, b, a] = node.inputs[tmp_value_name].default_value
-                        value_list.append([r, g, b, a])
-                    else:
-                        value_list.append(
-                            node.inputs[value_name].default_value)
-
-                for socket in node.inputs:
-                    if socket.is_linked:
-                        from_node = socket.links[0].from_node
-                        find_values(from_node, value_name)
-        find_values(node, value_name)
-        return value_list
+        # skip already prepared material
+        for node in mat.node_tree.nodes:
+            if NODE_TAG in node.keys():
+                return
+
+        active_output = prepare_material_for_bake(mat)
+
+        # Deselect all nodes
+        for node in mat.node_tree.nodes:
+            node.select = False
+
+        # temp nodes
+        for node in mat.node_tree.nodes:
+            if node.type == "OUTPUT_MATERIAL" and NODE_TAG in node.keys():
+                material_output = node
+        pb_output_node = self.new_pb_output_node(mat)
+        pb_emission_node = self.new_pb_emission_node(mat, [0, 0, 0, 1])
+        combine_node = mat.node_tree.nodes.new(type="ShaderNodeCombineRGB")
+        combine_node[NODE_TAG] = 1
+        pb_output_node.location.x = active_output.location.x
+        pb_emission_node.location.x = active_output.location.x
+        combine_node.location.x = active_output.location.x - NODE_OFFSET_X
+
+        # activate temp output and deactivate others
+        deactivate_material_outputs(mat)
+        pb_output_node.is_active_output = True
+
+        socket_to_surface = material_output.inputs['Surface'].links[0].from_socket
+        for channel, job_name in enumerate(job_names):
+            prepare_bake(mat, socket_to_surface,
+                         combine_node.inputs[channel], job_name)
+
+        # link combine_node to pb_emission_node to material_output
+        mat.node_tree.links.new(
+            combine_node.outputs[0], pb_emission_node.inputs['Color'])
+        mat.node_tree.links.new(
+            pb_emission_node.outputs[0], pb_output_node.inputs['Surface'])
+
+        # put temp nodes in a frame
+        p_baker_frame = mat.node_tree.nodes["p_baker_temp_frame"]
+        for node in mat.node_tree.nodes:
+            if NODE_TAG in node.keys():
+                node.parent = p_baker_frame
 
     def get_value_list_from_node_types(self, node, value_name, node_types):
         value_list = []
@@ -807,36 +1079,611 @@ class PBAKER_OT_bake(bpy.types.Operator):
                                  PREF_MARGIN_DIV=self.settings.lightmap_margin)
 
     def auto_uv_project(self, obj):
-        orig_selected_objects = self.selected_objects
-        for o in self.selected_objects:
-            select_set(o, False)
-        select_set(obj, True)
+        orig_selected_objects = self.selection.selected
+        self.selection.set([obj])
 
         if self.settings.auto_uv_project == 'SMART':
             self.smart_project()
         elif self.settings.auto_uv_project == 'LIGHTMAP':
             self.lightmap_pack()
 
-        for o in orig_selected_objects:
-            select_set(o, True)
+        self.selection.set(orig_selected_objects)
+
+    def prepare_fingerprints(self, objects):
+        self.object_fingerprints = {}
+        self.job_fingerprints = {}
+        node_tree_cache = {}
+        settings_fingerprint = get_settings_fingerprint(self.settings, FINGERPRINT_SETTINGS)
+        settings_fingerprint += get_properties_fingerprint(self.render_settings)
+
+        for obj in get_only_meshes(objects):
+            h = hashlib.sha1(settings_fingerprint.encode('utf-8'))
+            h.update(obj.name.encode('utf-8'))
+            h.update(get_mesh_fingerprint(obj).encode('utf-8'))
+            # unused slots (e.g. the appended new material) do not alter the bake
+            used_indices = get_used_material_indices(obj.data)
+            for index, mat_slot in enumerate(obj.material_slots):
+                if index not in used_indices:
+                    continue
+                if mat_slot.material and mat_slot.material.node_tree:
+                    h.update(get_node_tree_fingerprint(
+                        mat_slot.material.node_tree, node_tree_cache).encode('utf-8'))
+            self.object_fingerprints[obj] = h.hexdigest()
+
+    def get_job_fingerprint(self, objects, job_name):
+        h = hashlib.sha1(job_name.encode('utf-8'))
+        h.update(get_settings_fingerprint(
+            self.settings, get_job_settings(job_name)).encode('utf-8'))
+        for obj in sorted(objects, key=lambda o: o.name):
+            h.update(self.object_fingerprints[obj].encode('utf-8'))
+        return h.hexdigest()
+
+    def get_output_file_names(self, image_file_name, image_objects):
+        """files written for image_file_name. UDIM: <name>.<tile>.<ext> of each tile"""
+        if not self.settings.use_udim:
+            return [image_file_name]
+        return [get_udim_file_path(image_file_name, tile)
+                for tile, resolution in self.get_udim_plan(image_objects)]
+
+    def get_dirty_reason(self, image_file_name, objects, job_name, image_objects=None):
+        """returns reason to (re)bake or None, if image is up to date.
+        image_objects: objects baked to, if not objects"""
+        fingerprint = self.get_job_fingerprint(objects, job_name)
+        file_names = self.get_output_file_names(
+            image_file_name, image_objects if image_objects else objects)
+        for file_name in file_names:
+            self.job_fingerprints[file_name] = fingerprint
+        if job_name in SCENE_DEPENDENT_JOBS:
+            return "scene dependent"
+        if not file_names:
+            return "missing"
+        for file_name in file_names:
+            if not self.is_image_file(file_name):
+                return "missing"
+            if file_name not in self.fingerprints:
+                return "untracked"
+            if not self.fingerprints[file_name] == fingerprint:
+                return "changed"
+            # file written by someone else
+            file_stat = self.file_stats.get(file_name)
+            if file_stat and not tuple(file_stat) == self.output_index.get_stat(file_name):
+                return "modified"
+        return None
+
+    def skip_job(self, image_file_name, objects, job_name, report=True, image_objects=None):
+        file_names = self.get_output_file_names(
+            image_file_name, image_objects if image_objects else objects)
+        # UDIM, no tiles
+        if not file_names:
+            return False
+        if self.settings.use_incremental:
+            if self.get_dirty_reason(image_file_name, objects, job_name, image_objects) is None:
+                if report:
+                    self.report({'INFO'}, "baking skipped for '{0}'. Unchanged.".format(
+                        image_file_name))
+                return True
+            return False
+
+        if not self.settings.use_overwrite and \
+                all(self.is_image_file(file_name) for file_name in file_names):
+            if report:
+                self.report({'INFO'}, "baking skipped for '{0}'. File exists.".format(
+                    image_file_name))
+            return True
+        return False
+
+    def record_fingerprint(self, image):
+        if self.settings.use_incremental:
+            image_file_name = bpy.path.basename(image.filepath)
+            if image_file_name in self.job_fingerprints:
+                self.fingerprints[image_file_name] = self.job_fingerprints[image_file_name]
+                file_stat = self.output_index.get_stat(image_file_name)
+                if file_stat:
+                    self.file_stats[image_file_name] = list(file_stat)
+
+    def get_joblist(self, objects):
+        joblist = []
+        if self.settings.use_autodetect:
+            joblist = get_joblist_from_objects(objects)
+        else:
+            joblist = get_joblist_manual()
+
+        self.extend_joblist(joblist)
+
+        if self.settings.use_vertex_color:
+            if "Vertex_Color" not in joblist:
+                if any(len(obj.data.vertex_colors) > 0 for obj in objects):
+                    joblist.append("Vertex_Color")
+        return joblist
+
+    def can_be_value(self, job_name):
+        """True if job can be replaced by an input value of the Principled BSDF"""
+        if job_name not in NODE_INPUTS:
+            return False
+        return job_name not in NORMAL_INPUTS + ['Emission', 'Alpha']
+
+    def remove_image_file(self, image):
+        image_file_name = bpy.path.basename(image.filepath)
+        if self.output_index.is_file(image_file_name):
+            os.remove(bpy.path.abspath(image.filepath))
+            self.output_index.remove(image_file_name)
+
+    def update_coverage(self, objects):
+        """UV triangles of the objects baked to, for masks of baked pixels"""
+        key = tuple((obj.name, obj.data.uv_layers.active.name)
+                    for obj in objects if obj.data.uv_layers.active)
+        if key != self.coverage_key:
+            self.coverage_key = key
+            self.coverage_triangles = get_uv_triangles(objects)
+            self.coverage_masks = {}
+
+    def get_coverage_mask(self, image):
+        """True for pixels of image inside of the UV islands"""
+        size = (image.size[0], image.size[1])
+        if size not in self.coverage_masks:
+            self.coverage_masks[size] = get_uv_coverage(
+                self.coverage_triangles, size[0], size[1])
+        return self.coverage_masks[size]
+
+    def check_uniform_image(self, image, job_name):
+        """returns True, if image was replaced by a value and must not be saved.
+        Uniform images that can not be replaced by a value are scaled to 1x1"""
+        if not self.settings.use_uniform_detection or self.settings.use_udim:
+            return False
+        # alpha to color needs both images in full size
+        if self.settings.use_alpha_to_color and job_name in ['Color', 'Alpha']:
+            return False
+        # composed diffuse outputs need the components in full size
+        if job_name in DIFFUSE_COMPONENT_JOBS:
+            return False
+
+        color = get_uniform_color(
+            image, self.settings.uniform_tolerance, self.get_coverage_mask(image))
+        if color is None:
+            return False
+
+        if self.settings.uniform_output == 'VALUE' and self.can_be_value(job_name):
+            if job_name in SRGB_INPUTS and not image.is_float:
+                color[0:3] = srgb_to_linear(color[0:3]).tolist()
+            self.uniform_values[job_name] = color
+            self.remove_image_file(image)  # pre-saved file
+            self.report({'INFO'}, "'{0}' is uniform. Image not saved.".format(
+                image.name))
+            return True
+
+        image.scale(1, 1)
+        set_image_pixels(image, color)
+        self.report({'INFO'}, "'{0}' is uniform. Scaled to 1x1.".format(
+            image.name))
+        return False
+
+    def check_duplicate_image(self, image, job_name):
+        """returns True, if an identical image has been baked before.
+        The file will not be saved, but listed as alias in the manifest"""
+        if not self.settings.use_deduplication or self.settings.use_udim:
+            return False
+        # alpha to color alters the color image later
+        if self.settings.use_alpha_to_color and job_name in ['Color', 'Alpha']:
+            return False
+        if job_name in DIFFUSE_COMPONENT_JOBS:
+            return False
+
+        pixels = get_image_pixels(image)
+        key = (image.size[0], image.size[1], image.is_float,
+               image.colorspace_settings.name, get_pixels_digest(pixels))
+
+        for other in self.image_digests.get(key, []):
+            if is_pixels_equal(pixels, other):
+                self.duplicate_images[job_name] = other
+                alias = bpy.path.basename(image.filepath)
+                self.image_aliases[alias] = bpy.path.basename(other.filepath)
+                self.remove_image_file(image)  # pre-saved file
+                self.report({'INFO'}, "'{0}' is identical to '{1}'. Image not saved.".format(
+                    image.name, other.name))
+                self.record_fingerprint(image)
+                return True
+
+        self.image_digests.setdefault(key, []).append(image)
+        return False
+
+    def can_multiplex(self, job_name):
+        if self.settings.use_udim:
+            return False
+        return self.settings.use_multiplex and job_name in SCALAR_INPUTS
+
+    def get_multiplex_jobs(self, joblist, job_name, object_name, fingerprint_objects):
+        """returns job_name and up to 2 following scalar jobs, which will not be skipped"""
+        job_names = [job_name]
+        for other_job_name in joblist[joblist.index(job_name) + 1:]:
+            if len(job_names) == 3:
+                break
+            if self.can_multiplex(other_job_name):
+                image_file_name = self.get_image_file_name(
+                    object_name, other_job_name)
+                if not self.skip_job(image_file_name, fingerprint_objects, other_job_name, report=False):
+                    job_names.append(other_job_name)
+        return job_names
+
+    def prepare_objects_for_job(self, objects, job_name):
+        if job_name == 'MatID':
+            self.prepare_objects_for_bake_matid(objects)
+        elif job_name == 'Vertex_Color':
+            self.prepare_objects_for_bake_vertex_color(objects)
+        elif job_name == 'Wireframe':
+            self.prepare_objects_for_bake_wireframe(objects)
+        elif job_name == 'Diffuse' or job_name in DIFFUSE_COMPONENT_JOBS:
+            pass  # prepare nothing
+        else:
+            self.prepare_objects_for_bake(objects, job_name)
 
-    def bake_and_save(self, image, bake_type='EMIT', selected_to_active=False):
+    def add_temp_materials(self, objects):
+        # temp material for vertex color
+        if self.settings.use_vertex_color:
+            for obj in objects:
+                if not has_material(obj):
+                    add_temp_material(obj)
+
+    def create_bake_image_nodes(self, objects, image):
+        for obj in objects:
+            for mat_slot in obj.material_slots:
+                if mat_slot.material:
+                    self.create_bake_image_node(mat_slot.material, image)
+
+    def bake_job(self, object_name, job_name, image, objects, image_objects, selected_to_active=False):
+        """prepare materials of objects, bake to image nodes in image_objects and save"""
+        self.update_coverage(image_objects)
+        self.add_temp_materials(objects)
+        self.prepare_objects_for_job(objects, job_name)
+        if self.settings.use_udim:
+            self.bake_udim_tiles(object_name, job_name, image,
+                                 image_objects, selected_to_active)
+            return
+        self.create_bake_image_nodes(image_objects, image)
+        self.bake_and_save(image, bake_type=get_bake_type(job_name),
+                           selected_to_active=selected_to_active, job_name=job_name)
+
+    def get_udim_plan(self, objects):
+        """[(tile, resolution)] of all UDIM tiles the active UV maps of objects touch"""
+        key = tuple(sorted(obj.name for obj in objects))
+        if key not in self.udim_plans:
+            tile_areas = {}
+            for obj in objects:
+                uv_layer = obj.data.uv_layers.active
+                if not uv_layer:
+                    continue
+                sx, sy, sz = obj.matrix_world.to_scale()
+                tiles = get_udim_tiles(obj.data, get_uv_coordinates(uv_layer),
+                                       abs(sx * sy * sz) ** (2 / 3))
+                for tile, area in tiles.items():
+                    tile_areas[tile] = tile_areas.get(tile, 0.0) + area
+            resolutions = get_udim_resolutions(
+                tile_areas, self.get_resolution(), self.settings.use_udim_density)
+            self.udim_plans[key] = sorted(resolutions.items())
+        return self.udim_plans[key]
+
+    def bake_udim_tiles(self, object_name, job_name, image, image_objects, selected_to_active=False):
+        """bake and save each UDIM tile as <name>.<tile>.<ext>. image becomes the first tile.
+        Tiles are moved to the 0-1 UV square one at a time"""
+        plan = self.get_udim_plan(image_objects)
+        if not plan:
+            self.report({'INFO'}, "'{0}': no UDIM tiles.".format(image.name))
+            return
+
+        # meshes used by more than one object are moved once
+        uv_layers = {}
+        for obj in image_objects:
+            if obj.data.uv_layers.active:
+                uv_layers[obj.data.name] = obj.data.uv_layers.active
+        orig_uvs = dict((name, get_uv_coordinates(uv_layer))
+                        for name, uv_layer in uv_layers.items())
+
+        try:
+            for index, (tile, resolution) in enumerate(plan):
+                if index == 0:
+                    # not saved yet, still a generated image
+                    file_path = get_udim_file_path(image.filepath, tile)
+                    image.name = bpy.path.basename(file_path)
+                    image.filepath = file_path
+                    image.generated_width = resolution
+                    image.generated_height = resolution
+                    tile_image = image
+                else:
+                    tile_image = self.new_bake_image(
+                        object_name, job_name, tile, resolution)
+
+                tile_u, tile_v = (tile - UDIM_FIRST_TILE) % 10, (tile - UDIM_FIRST_TILE) // 10
+                for name, uv_layer in uv_layers.items():
+                    uvs = orig_uvs[name] - (tile_u, tile_v)
+                    uv_layer.data.foreach_set('uv', uvs.reshape(-1))
+
+                self.create_bake_image_nodes(image_objects, tile_image)
+                self.bake_and_save(tile_image, bake_type=get_bake_type(job_name),
+                                   selected_to_active=selected_to_active, job_name=job_name)
+                if index > 0:
+                    bpy.data.images.remove(tile_image)
+        finally:
+            for name, uv_layer in uv_layers.items():
+                uv_layer.data.foreach_set('uv', orig_uvs[name].reshape(-1))
+
+    def bake_multiplexed_jobs(self, job_names, object_name, objects, image_objects, selected_to_active=False):
+        """bake up to 3 scalar jobs in one pass to R, G and B. returns dictionary of split images"""
+        if len(job_names) == 1:
+            image = self.new_bake_image(object_name, job_names[0])
+            self.bake_job(object_name, job_names[0], image, objects,
+                          image_objects, selected_to_active)
+            return {job_names[0]: image}
+
+        combined_image = self.new_bake_image(object_name, job_names[0])
+        combined_image.name = "PBAKER_MULTIPLEX_" + "_".join(job_names)
+        self.update_coverage(image_objects)
+
+        self.add_temp_materials(objects)
+        for obj in objects:
+            for mat_slot in obj.material_slots:
+                if mat_slot.material:
+                    self.prepare_material_for_multiplexed_jobs(
+                        mat_slot.material, job_names)
+        self.create_bake_image_nodes(image_objects, combined_image)
+
+        self.report({'INFO'}, "baking '{0}'".format(
+            "', '".join(self.get_image_file_name(object_name, j) for j in job_names)))
+        bake_time = self.bake('EMIT', selected_to_active)
+
+        start = time.time()
+        pixels = get_image_pixels(combined_image)
+        images = {}
+        for channel, job_name in enumerate(job_names):
+            image = self.new_bake_image(object_name, job_name)
+            self.pre_save_image(image)
+            set_image_pixels(image, get_channel_pixels(pixels, channel))
+            self.save_baked_image(image, job_name)
+            images[job_name] = image
+        bpy.data.images.remove(combined_image)
+        self.record_timing(job_names, bake_time, time.time() - start)
+        return images
+
+    def pre_save_image(self, image):
+        """2.80: saved images are reloaded from file in save_baked_image(), not generated again"""
         if is_2_80:
             image.save()
+            self.output_index.update(bpy.path.basename(image.filepath))
+
+    def bake_and_save(self, image, bake_type='EMIT', selected_to_active=False, job_name=None):
+        self.pre_save_image(image)
+
+        if self.needs_denoise_measurement(job_name):
+            self.measure_denoise(image, bake_type, selected_to_active, job_name)
 
         self.report({'INFO'}, "baking '{0}'".format(image.name))
-        self.bake(bake_type, selected_to_active)
+        bake_time = self.bake(bake_type, selected_to_active, job_name)
+
+        start = time.time()
+        self.save_baked_image(image, job_name)
+        self.record_timing([job_name], bake_time, time.time() - start)
+
+    def needs_denoise_measurement(self, job_name):
+        if not self.settings.use_denoise or not self.settings.measure_denoise:
+            return False
+        if self.settings.use_udim:
+            return False
+        return job_name in DENOISE_JOBS and job_name not in self.denoise_measured
+
+    def measure_denoise(self, image, bake_type, selected_to_active, job_name):
+        """bake with fewer samples and report the error of raw and denoised results
+        against a bake with 4x samples"""
+        samples = self.settings.samples
+        self.bake(bake_type, selected_to_active, job_name, samples * 4)
+        reference = get_image_pixels(image)
+        mask = self.get_coverage_mask(image)
+
+        results = []
+        for count in sorted(set([max(1, samples // 4), max(1, samples // 2), samples])):
+            self.bake(bake_type, selected_to_active, job_name, count)
+            pixels = get_image_pixels(image)
+            denoised = get_denoised_pixels(pixels, image.size[0], image.size[1], mask,
+                                           radius=self.settings.denoise_radius,
+                                           sigma=self.settings.denoise_sigma)
+            results.append("{0}: {1:.4f} / {2:.4f}".format(
+                count, get_rmse(pixels, reference, mask), get_rmse(denoised, reference, mask)))
+
+        self.denoise_measured.add(job_name)
+        self.report({'INFO'}, "Denoise '{0}', samples: RMSE raw / denoised against {1} samples. {2}".format(
+            job_name, samples * 4, ", ".join(results)))
+
+    def denoise_image(self, job_name, image, normal_image=None):
+        """edge-aware denoising, guided by the baked Normal"""
+        pixels = get_image_pixels(image)
+        mask = self.get_coverage_mask(image)
+        guide = None
+        if normal_image and normal_image.size[:] == image.size[:]:
+            guide = get_image_pixels(normal_image)
+        set_image_pixels(image, get_denoised_pixels(
+            pixels, image.size[0], image.size[1], mask, guide,
+            self.settings.denoise_radius, self.settings.denoise_sigma))
+        if self.use_exr_bundle():
+            return image
+        self.save_image(image, job_name)
+        self.record_fingerprint(image)
+        return image
+
+    def use_exr_bundle(self):
+        if self.settings.use_udim:
+            return False
+        return self.settings.file_format == 'OPEN_EXR' and self.settings.use_exr_bundle
+
+    def write_exr_bundle(self, object_name, new_images, derived_images):
+        """write all images of object_name as layers of one multi-part EXR"""
+        images = dict(new_images)
+        images.update(derived_images)
+        if not images:
+            return
+
+        codec = self.settings.exr_codec
+        if codec not in EXR_COMPRESSIONS:
+            self.report({'INFO'}, "Multi-Layer EXR: '{0}' not supported, ZIP used.".format(
+                codec))
+            codec = 'ZIP'
+        pixel_type = 'HALF' if self.settings.color_depth == '16' else 'FLOAT'
+        channels = [('R', 0), ('G', 1), ('B', 2)]
+        if self.settings.color_mode == 'RGBA':
+            channels.append(('A', 3))
+
+        job_names = sorted(images.keys())
+        layers = [MultiPartExrLayer(job_name, images[job_name].size[0], images[job_name].size[1], channels)
+                  for job_name in job_names]
+
+        file_name = "{0}.{1}".format(self.get_image_prefix(object_name),
+                                     IMAGE_FILE_FORMAT_ENDINGS['OPEN_EXR'])
+        writer = MultiPartExrWriter(os.path.join(self.output_dir, file_name),
+                                    layers, pixel_type, codec)
+        for index, job_name in enumerate(job_names):
+            image = images[job_name]
+            pixels = get_image_pixels(image)
+            # EXR is linear
+            if not image.is_float and image.colorspace_settings.name == 'sRGB':
+                pixels[:, 0:3] = srgb_to_linear(pixels[:, 0:3])
+            writer.write_layer(index, pixels)
+        writer.close()
+        self.output_index.update(file_name)
+        self.report({'INFO'}, "'{0}' saved with {1} layers.".format(
+            file_name, len(layers)))
+
+        # images of the new material have no file of their own
+        for image in new_images.values():
+            if not image.packed_file:
+                if is_2_79:
+                    image.pack(as_png=True)
+                else:
+                    image.pack()
 
-        self.save_image(image)
+    def get_triangle_count(self, objects):
+        for obj in objects:
+            if obj not in self.triangle_counts:
+                self.triangle_counts[obj] = get_triangle_count([obj])
+        return sum(self.triangle_counts[obj] for obj in objects)
+
+    def record_timing(self, job_names, bake_time, save_time):
+        """jobs baked in one pass share the durations"""
+        triangles = self.get_triangle_count(self.current_objects)
+        for job_name in job_names:
+            self.timing_model.record(job_name, self.get_resolution(), self.settings.samples, triangles,
+                                     bake_time / len(job_names), save_time / len(job_names))
+
+    def predict_job_time(self, job_name, objects):
+        """returns predicted seconds or None"""
+        return self.timing_model.predict(job_name, self.get_resolution(), self.settings.samples,
+                                         self.get_triangle_count(objects))
+
+    def predict_object_time(self, obj):
+        """sort key for scheduling: predicted seconds of the jobs of obj, triangle count"""
+        predicted = sum(self.predict_job_time(job_name, [obj]) or 0.0
+                        for job_name in self.get_joblist([obj]))
+        return (predicted, self.get_triangle_count([obj]))
+
+    def save_baked_image(self, image, job_name):
+        if self.check_uniform_image(image, job_name):
+            return
+        if self.check_duplicate_image(image, job_name):
+            return
+        if self.use_exr_bundle():
+            # written with all jobs of the object - see write_exr_bundle()
+            self.remove_image_file(image)  # pre-saved file
+            return
+
+        self.save_image(image, job_name)
+        self.image_aliases.pop(bpy.path.basename(image.filepath), None)
+        self.record_fingerprint(image)
         if is_2_80:
             image.reload()
 
-    def bake(self, bake_type, selected_to_active=False):
+    def isolate_bake_objects(self, job_name):
+        """hide all but selected objects (and cage) from rendering"""
+        if not self.settings.use_isolation or job_name in SCENE_DEPENDENT_JOBS:
+            self.isolation.restore()
+            return
+
+        keep_objects = set(self.selection.selected)
+        if self.render_settings.use_cage:
+            cage_object = self.render_settings.cage_object
+            if isinstance(cage_object, str):
+                cage_object = bpy.data.objects.get(cage_object)
+            if cage_object:
+                keep_objects.add(cage_object)
+        self.isolation.set(keep_objects)
+
+    def measure_isolation(self, bake_args):
+        """bake with and without isolation and report the time saved.
+        returns seconds of the isolated bake"""
+        hidden_count = len(self.isolation.hidden)
+        keep_objects = set(self.isolation.orig_hide_render.keys()) - \
+            self.isolation.hidden
+
+        self.isolation.restore()
+        start = time.time()
+        bpy.ops.object.bake(**bake_args)
+        full_time = time.time() - start
+
+        self.isolation.set(keep_objects)
+        start = time.time()
+        bpy.ops.object.bake(**bake_args)
+        isolated_time = time.time() - start
+
+        self.isolation_measured = True
+        self.report({'INFO'}, "Isolation: {0:.2f}s instead of {1:.2f}s, {2:.2f}s saved ({3} objects hidden)".format(
+            isolated_time, full_time, full_time - isolated_time, hidden_count))
+        return isolated_time
+
+    def get_bake_profile_values(self):
+        """returns (tile size, threads) of the calibration or defaults for device and resolution"""
+        device = get_bake_device()
+        resolution = self.get_resolution()
+        values = self.tile_calibration.get("{}_{}".format(device, resolution))
+        if isinstance(values, list):
+            return tuple(values)
+        # calibrations without threads keep their tile size
+        tile_size = values if values else get_default_tile_size(device, resolution)
+        return tile_size, get_default_threads(resolution, tile_size)
+
+    def needs_tile_calibration(self):
+        if not self.settings.use_bake_profile or not self.settings.use_tile_calibration:
+            return False
+        key = "{}_{}".format(get_bake_device(), self.get_resolution())
+        return not isinstance(self.tile_calibration.get(key), list)
+
+    def calibrate_bake_profile(self, bake_args):
+        """bake with all candidate tile sizes and thread counts and remember the fastest.
+        returns seconds of the fastest bake"""
+        device = get_bake_device()
+        resolution = self.get_resolution()
+        candidates = []
+        for tile_size in sorted(set(min(t, resolution) for t in TILE_SIZES[device])):
+            for threads in get_thread_candidates(device, resolution, tile_size):
+                candidates.append((tile_size, threads))
+
+        timings = {}
+        for tile_size, threads in candidates:
+            self.bake_profile.set(tile_size, threads)
+            start = time.time()
+            bpy.ops.object.bake(**bake_args)
+            timings[(tile_size, threads)] = time.time() - start
+
+        best = min(candidates, key=timings.get)
+        self.tile_calibration["{}_{}".format(device, resolution)] = list(best)
+        write_json(get_user_config_path(
+            TILE_CALIBRATION_FILE_NAME), self.tile_calibration)
+        self.report({'INFO'}, "Tile calibration ({0}, {1}px): {2}".format(device, resolution, ", ".join(
+            "{0}/{1} threads: {2:.2f}s".format(t, n, timings[(t, n)]) for t, n in candidates)))
+        return timings[best]
+
+    def bake(self, bake_type, selected_to_active=False, job_name=None, samples=None):
+        """returns seconds of one bake, without extra bakes of measurements"""
         org_samples = bpy.context.scene.cycles.samples
-        bpy.context.scene.cycles.samples = self.settings.samples
+        bpy.context.scene.cycles.samples = samples or self.settings.samples
 
         pass_filter = []
-        if self.settings.use_Diffuse:
+        if job_name in DIFFUSE_COMPONENT_JOBS:
+            pass_filter.append(DIFFUSE_COMPONENT_JOBS[job_name])
+        elif self.settings.use_Diffuse:
             if self.render_settings.use_pass_direct:
                 pass_filter.append('DIRECT')
             if self.render_settings.use_pass_indirect:
@@ -845,7 +1692,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 pass_filter.append('COLOR')
         pass_filter = set(pass_filter)
 
-        bpy.ops.object.bake(
+        bake_args = dict(
             type=bake_type,
             pass_filter=pass_filter,
             use_selected_to_active=selected_to_active,
@@ -853,7 +1700,24 @@ class PBAKER_OT_bake(bpy.types.Operator):
             normal_r=self.render_settings.normal_r,
             normal_g=self.render_settings.normal_g,
             normal_b=self.render_settings.normal_b, )
+
+        self.isolate_bake_objects(job_name)
+        if self.settings.use_bake_profile:
+            self.bake_profile.set(*self.get_bake_profile_values())
+
+        if self.settings.measure_isolation and self.isolation.hidden and not self.isolation_measured:
+            bake_time = self.measure_isolation(bake_args)
+        elif self.needs_tile_calibration():
+            bake_time = self.calibrate_bake_profile(bake_args)
+        else:
+            start = time.time()
+            bpy.ops.object.bake(**bake_args)
+            bake_time = time.time() - start
+
+        if self.settings.use_bake_profile:
+            self.bake_profile.restore()
         bpy.context.scene.cycles.samples = org_samples
+        return bake_time
 
     def final_cleanup(self):
         # Auto Smooth - Clean up!
@@ -861,15 +1725,37 @@ class PBAKER_OT_bake(bpy.types.Operator):
             for obj in self.auto_smooth_list:
                 obj.data.use_auto_smooth = self.auto_smooth_list[obj]
 
+        # Isolation - Clean up!
+        self.isolation.restore()
+
+        # Threads and tiles - Clean up!
+        if self.settings.use_bake_profile:
+            self.bake_profile.restore()
+
         # Clean up! - Re-Select objects
-        for obj in self.orig_selected_objects:
-            select_set(obj, True)
+        self.selection.restore()
+        self.report({'INFO'}, "{0} selection updates.".format(self.selection.updates))
 
         # Render Engine - Clean up!
         if self.prefs.switch_to_cycles:
             bpy.context.scene.render.engine = self.render_engine
             bpy.context.scene.cycles.preview_pause = self.preview_pause
 
+        # Temp materials - Clean up!
+        remove_temp_materials()
+
+        # Flattened node groups - Clean up!
+        clear_group_templates()
+
+        # Manifest - Clean up!
+        write_manifest(self.output_dir, self.manifest)
+
+        # Timings - Clean up!
+        self.timing_model.save()
+
+        # list of changes is outdated now
+        bpy.context.scene.principled_baker_dirty_jobs.clear()
+
     def select_uv_map(self, obj):
         # 2.79/2.80
         uv_layers = obj.data.uv_textures if is_2_79 else obj.data.uv_layers
@@ -884,6 +1770,51 @@ class PBAKER_OT_bake(bpy.types.Operator):
             if index_uv_layer <= len(obj.data.uv_layers) - 1:
                 uv_layers.active_index = index_uv_layer
 
+    def pack_atlas_uvs(self, objects):
+        """one shared UV layout: islands of the active UV maps of all objects, scaled
+        by their surface area and packed into the UV map ATLAS_UV_NAME"""
+        # meshes used by more than one object are packed once
+        mesh_objects = {}
+        for obj in objects:
+            mesh_objects.setdefault(obj.data.name, obj)
+
+        meshes = []
+        sizes = []
+        for obj in mesh_objects.values():
+            mesh = obj.data
+            uv_layer = mesh.uv_layers.active
+            if not uv_layer:
+                continue
+            if uv_layer.name == ATLAS_UV_NAME:  # packed before
+                uv_layer = next((l for l in mesh.uv_layers if l.name != ATLAS_UV_NAME), uv_layer)
+            uvs = get_uv_coordinates(uv_layer)
+            # same texel density for all objects
+            sx, sy, sz = obj.matrix_world.to_scale()
+            islands = get_uv_island_rects(mesh, uvs, abs(sx * sy * sz) ** (2 / 3))
+            meshes.append((mesh, uvs, islands, len(sizes)))
+            sizes.extend(islands[3])
+
+        if not sizes:
+            return
+        margin = self.settings.atlas_margin / self.get_resolution()
+        offsets, scale = pack_rectangles(sizes, margin)
+
+        for mesh, uvs, islands, first in meshes:
+            loop_islands, low, island_scales = islands[:3]
+            atlas_uvs = get_atlas_uvs(uvs, loop_islands, low, island_scales,
+                                      offsets[first:first + len(low)], scale)
+
+            # 2.79/2.80
+            uv_layers = mesh.uv_textures if is_2_79 else mesh.uv_layers
+            if ATLAS_UV_NAME not in mesh.uv_layers:
+                uv_layers.new(name=ATLAS_UV_NAME)
+            mesh.uv_layers[ATLAS_UV_NAME].data.foreach_set('uv', atlas_uvs)
+            # bakes use the active UV map. The render UV map is left to the original
+            # materials, the new material uses ATLAS_UV_NAME explicitly
+            uv_layers.active_index = uv_layers.keys().index(ATLAS_UV_NAME)
+        self.report({'INFO'}, "{0} UV islands packed to '{1}'.".format(
+            len(sizes), ATLAS_UV_NAME))
+
     def check_file_path(self):
         path = self.settings.file_path
 
@@ -904,6 +1835,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 abs_path = bpy.path.abspath(cwd + os.path.sep + path)
 
         os_abs_path = os.path.abspath(abs_path)
+        self.output_dir = os_abs_path
 
         if not os.path.exists(os_abs_path):
             try:
@@ -912,10 +1844,10 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 return False
 
         if check_permission(os_abs_path):
+            self.output_index = DirectoryIndex(os_abs_path)
             return True
 
-    # def excecute(self, context):
-    def invoke(self, context, event):
+    def init_settings(self, context):
         # 2.79
         if is_2_79:
             self.prefs = context.user_preferences.addons[__package__].preferences
@@ -928,6 +1860,16 @@ class PBAKER_OT_bake(bpy.types.Operator):
         self.active_object = context.active_object
         self.selected_objects = bpy.context.selected_objects
 
+    def read_manifest(self):
+        self.manifest = read_manifest(self.output_dir)
+        self.image_aliases = self.manifest.setdefault('aliases', {})
+        self.fingerprints = self.manifest.setdefault('fingerprints', {})
+        self.file_stats = self.manifest.setdefault('files', {})
+
+    def setup(self, context):
+        """checks and preparations before baking. returns {'CANCELLED'} on errors"""
+        self.init_settings(context)
+
         self.new_node_colors = {
             "Alpha": [1.0, 1.0, 1.0, 1.0],
             "Translucent_Alpha": [0.8, 0.8, 0.8, 1.0],
@@ -948,6 +1890,11 @@ class PBAKER_OT_bake(bpy.types.Operator):
                         "'{}' Permission denied".format(self.settings.file_path))
             return {'CANCELLED'}
 
+        # Manifest - see clean up!
+        self.read_manifest()
+        self.image_digests = {}
+        self.duplicate_images = {}
+
         # Input error handling
         if not self.active_object.type == 'MESH':
             self.report({'ERROR'}, '{0} is not a mesh object'.format(
@@ -978,10 +1925,23 @@ class PBAKER_OT_bake(bpy.types.Operator):
             return {'CANCELLED'}
 
         # Select only meshes
-        self.orig_selected_objects = bpy.context.selected_objects
-        for obj in self.selected_objects:
-            if not obj.type == 'MESH':
-                select_set(obj, False)
+        self.selection = SelectionState(self.selected_objects)
+        self.selection.set(get_only_meshes(self.selected_objects))
+
+        # Hide other objects from rendering - see clean up!
+        self.isolation = RenderIsolation(bpy.context.scene.objects)
+        self.isolation_measured = False
+
+        # threads and tiles for bake calls
+        self.bake_profile = BakePerformanceProfile(bpy.context.scene)
+        self.tile_calibration = read_json(
+            get_user_config_path(TILE_CALIBRATION_FILE_NAME))
+
+        # durations of former bakes for ETA and scheduling - see clean up!
+        self.timing_model = TimingModel(
+            get_user_config_path(TIMING_DB_FILE_NAME))
+        self.triangle_counts = {}
+        self.current_objects = []
 
         # Auto Smooth - See clean up!
         self.auto_smooth_list = {}
@@ -995,7 +1955,16 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 for obj in self.selected_objects:
                     obj.data.use_auto_smooth = False
 
-        new_images = {}
+        self.uniform_values = {}
+        self.multiplexed_images = {}
+        self.udim_plans = {}
+        self.denoise_measured = set()
+        self.coverage_key = None
+        self.coverage_triangles = None
+        self.coverage_masks = {}
+        self.reuse_materials = False
+        self.baked_jobs = set()
+        self.all_material_outputs = {}
 
         bake_objects = []
         bake_objects = get_only_meshes(self.selected_objects)
@@ -1008,27 +1977,43 @@ class PBAKER_OT_bake(bpy.types.Operator):
         self.new_principled_node_settings = self.get_new_principled_node_settings(
             bake_objects)
 
+        # fingerprints of unaltered materials and meshes
+        if self.settings.use_incremental:
+            self.prepare_fingerprints(self.selected_objects)
+
+        self.bake_objects = bake_objects
+
+    def bake_steps(self):
+        """bakes all jobs. yields (object name, job name, remaining jobs, remaining objects) after each job.
+        The result of the operator is in self.result"""
+        self.result = {'FINISHED'}
+        new_images = {}
+        bake_objects = self.bake_objects
+
         ########
         # Bake Single/Batch:
         ########
         if self.settings.bake_mode == 'BATCH':
 
+            # longest jobs first
+            bake_objects = sorted(
+                bake_objects, key=self.predict_object_time, reverse=True)
+
             # BEGIN progress report
             bpy.context.window_manager.progress_begin(0, len(bake_objects))
             progress = 0
 
-            # Deselect all
-            for obj in bake_objects:
-                select_set(obj, False)
-
             for obj in bake_objects:
 
                 new_images.clear()
-
-                # Select only one
-                select_set(obj, True)
+                self.uniform_values.clear()
+                self.baked_jobs.clear()
 
                 obj_list = [obj]
+                self.current_objects = obj_list
+
+                # Select only one
+                self.selection.set(obj_list)
 
                 # Can bake?
                 if not self.can_bake(obj_list):
@@ -1060,6 +2045,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 # material outpus for later clean up
                 active_outputs = get_active_outputs(obj_list)
                 all_material_outputs = get_all_material_outputs(obj_list)
+                self.all_material_outputs = all_material_outputs
                 # 2.80
                 if not is_2_79:
                     set_material_outputs_target_to_all(obj_list)
@@ -1086,51 +2072,39 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 # Go through joblist
                 for job_name in joblist:
 
-                    # skip, if no overwrite and image exists. load existing image
+                    # skip, if no overwrite and image exists or unchanged. load existing image
+                    # jobs baked with a former job are not skipped - see bake_multiplexed_jobs()
                     image_file_name = self.get_image_file_name(
                         obj.name, job_name)
-                    if not self.settings.use_overwrite and self.is_image_file(image_file_name):
-                        self.report({'INFO'}, "baking skipped for '{0}'. File exists.".format(
-                            self.get_image_file_name(obj.name, job_name)))
+                    if job_name not in self.multiplexed_images and \
+                            self.skip_job(image_file_name, obj_list, job_name):
 
-                        # load image for new material
-                        new_images[job_name] = self.load_image(image_file_name)
+                        # load image for new material. UDIM: first tile
+                        new_images[job_name] = self.load_image(
+                            self.get_output_file_names(image_file_name, obj_list)[0])
 
                         continue  # skip job
 
                     # else: do bake
-                    # image to bake on
-                    image = self.new_bake_image(obj.name, job_name)
-
-                    # append image to image dict for new material
-                    new_images[job_name] = image
-
-                    # temp material for vertex color
-                    if self.settings.use_vertex_color:
-                        if not has_material(obj):
-                            add_temp_material(obj)
-
-                    # Prepare materials
-                    if job_name == 'MatID':
-                        self.prepare_objects_for_bake_matid(obj_list)
-                    elif job_name == 'Vertex_Color':
-                        self.prepare_objects_for_bake_vertex_color(obj_list)
-                    elif job_name == 'Wireframe':
-                        self.prepare_objects_for_bake_wireframe(obj_list)
-                    elif job_name == 'Diffuse':
-                        pass  # prepare nothing
+                    if self.can_multiplex(job_name):
+                        # bake with next scalar jobs in one pass
+                        if job_name not in self.multiplexed_images:
+                            job_names = self.get_multiplex_jobs(
+                                joblist, job_name, obj.name, obj_list)
+                            self.multiplexed_images = self.bake_multiplexed_jobs(
+                                job_names, obj.name, obj_list, obj_list)
+                        image = self.multiplexed_images.pop(job_name)
                     else:
-                        self.prepare_objects_for_bake(obj_list, job_name)
+                        # image to bake on
+                        image = self.new_bake_image(obj.name, job_name)
 
-                    # image nodes to bake
-                    for mat_slot in obj.material_slots:
-                        if mat_slot.material:
-                            self.create_bake_image_node(
-                                mat_slot.material, image)
+                        # Bake and Save image!
+                        self.bake_job(obj.name, job_name, image, obj_list, obj_list)
 
-                    # Bake and Save image!
-                    self.bake_and_save(
-                        image, bake_type=get_bake_type(job_name))
+                    self.baked_jobs.add(job_name)
+
+                    # append image to image dict for new material
+                    new_images[job_name] = image
 
                     # Clean up!
                     # delete temp materials
@@ -1149,19 +2123,31 @@ class PBAKER_OT_bake(bpy.types.Operator):
                         uv_layers = obj.data.uv_textures if is_2_79 else obj.data.uv_layers
                         uv_layers.active_index = orig_uv_layers_active_index
 
-                    # glossiness
-                    if job_name == "Roughness" and self.settings.use_invert_roughness:
-                        self.create_gloss_image(obj.name, image)
+                    # uniform image -> value in new material
+                    if job_name in self.uniform_values:
+                        del new_images[job_name]
+                        bpy.data.images.remove(image)
 
-                    # add alpha channel to color
-                    if self.settings.use_alpha_to_color and self.settings.color_mode == 'RGBA':
-                        if "Color" in new_images.keys() and "Alpha" in new_images.keys():
-                            new_images["Color"].pixels = get_combined_images(
-                                new_images["Color"], new_images["Alpha"], 0, 3)
-                            new_images["Color"].save()
+                    # duplicate image -> share identical image
+                    if job_name in self.duplicate_images:
+                        new_images[job_name] = self.duplicate_images.pop(
+                            job_name)
+                        bpy.data.images.remove(image)
+
+                    yield (obj.name, job_name, joblist[joblist.index(job_name) + 1:],
+                           len(bake_objects) - bake_objects.index(obj) - 1)
 
                 # jobs DONE
 
+                # derived outputs
+                derived_images = self.get_post_process_graph(obj.name).run(
+                    new_images, self.baked_jobs)
+                self.move_derived_jobs(new_images, derived_images)
+
+                # (optional) all textures in one EXR
+                if self.use_exr_bundle():
+                    self.write_exr_bundle(obj.name, new_images, derived_images)
+
                 # add new images to new material
                 if self.settings.make_new_material:
                     self.add_images_to_material(new_mat, new_images)
@@ -1191,33 +2177,24 @@ class PBAKER_OT_bake(bpy.types.Operator):
             bpy.context.window_manager.progress_end()
 
         ########
-        # Bake Combined:
+        # Bake Combined/Atlas:
         ########
-        elif self.settings.bake_mode == 'COMBINED':
+        elif self.settings.bake_mode in ['COMBINED', 'ATLAS']:
+            self.current_objects = bake_objects
 
             # Can bake?
             if not self.can_bake(bake_objects):
-                self.final_cleanup()
-                return {'CANCELLED'}
+                self.result = {'CANCELLED'}
+                return
 
             # Populate joblist
-            joblist = []
-            if self.settings.use_autodetect:
-                joblist = get_joblist_from_objects(bake_objects)
-            else:
-                joblist = get_joblist_manual()
-
-            self.extend_joblist(joblist)
-
-            if self.settings.use_vertex_color:
-                if "Vertex_Color" not in joblist:
-                    joblist.append("Vertex_Color")
+            joblist = self.get_joblist(bake_objects)
 
             # empty joblist -> nothing to do
             if not joblist:
-                self.final_cleanup()
                 self.report({'INFO'}, "Nothing to do.")
-                return {'CANCELLED'}
+                self.result = {'CANCELLED'}
+                return
 
             # BEGIN progress report
             bpy.context.window_manager.progress_begin(0, len(bake_objects))
@@ -1226,6 +2203,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
             # material outpus for later clean up
             active_outputs = get_active_outputs(bake_objects)
             all_material_outputs = get_all_material_outputs(bake_objects)
+            self.all_material_outputs = all_material_outputs
             # 2.80
             if not is_2_79:
                 set_material_outputs_target_to_all(bake_objects)
@@ -1245,60 +2223,56 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 if not self.settings.select_uv_map == 'SELECTED':
                     self.select_uv_map(obj)
 
+            # (optional) shared UV layout from the selected UV maps
+            if self.settings.bake_mode == 'ATLAS':
+                self.pack_atlas_uvs(bake_objects)
+                # the new material needs the atlas UV map
+                for obj in bake_objects:
+                    orig_uv_layers_active_indices[obj] = obj.data.uv_layers.active_index
+
             # (optional) new material
             if self.settings.make_new_material:
                 new_mat_name = self.active_object.name if self.settings.new_material_prefix == "" else self.settings.new_material_prefix
                 new_mat = self.new_material(new_mat_name)
 
             # Go through joblist
+            fingerprint_objects = bake_objects
             for job_name in joblist:
 
-                # skip, if no overwrite and image exists. load existing image
+                # skip, if no overwrite and image exists or unchanged. load existing image
+                # jobs baked with a former job are not skipped - see bake_multiplexed_jobs()
                 image_file_name = self.get_image_file_name(
                     self.active_object.name, job_name)
-                if not self.settings.use_overwrite and self.is_image_file(image_file_name):
-                    self.report({'INFO'}, "baking skipped for '{0}'. File exists.".format(
-                        self.get_image_file_name(obj.name, job_name)))
+                if job_name not in self.multiplexed_images and \
+                        self.skip_job(image_file_name, fingerprint_objects, job_name):
 
-                    # load image for new material
-                    new_images[job_name] = self.load_image(image_file_name)
+                    # load image for new material. UDIM: first tile
+                    new_images[job_name] = self.load_image(
+                        self.get_output_file_names(image_file_name, bake_objects)[0])
 
                     continue  # skip job
 
                 # else: do bake
-                # image to bake on
-                image = self.new_bake_image(self.active_object.name, job_name)
-
-                # append image to image dict for new material
-                new_images[job_name] = image
-
-                # temp material for vertex color
-                if self.settings.use_vertex_color:
-                    for obj in bake_objects:
-                        if not has_material(obj):
-                            add_temp_material(obj)
-
-                # Prepare materials
-                if job_name == 'MatID':
-                    self.prepare_objects_for_bake_matid(bake_objects)
-                elif job_name == 'Vertex_Color':
-                    self.prepare_objects_for_bake_vertex_color(bake_objects)
-                elif job_name == 'Wireframe':
-                    self.prepare_objects_for_bake_wireframe(bake_objects)
-                elif job_name == 'Diffuse':
-                    pass  # prepare nothing
+                if self.can_multiplex(job_name):
+                    # bake with next scalar jobs in one pass
+                    if job_name not in self.multiplexed_images:
+                        job_names = self.get_multiplex_jobs(
+                            joblist, job_name, self.active_object.name, fingerprint_objects)
+                        self.multiplexed_images = self.bake_multiplexed_jobs(
+                            job_names, self.active_object.name, bake_objects, bake_objects)
+                    image = self.multiplexed_images.pop(job_name)
                 else:
-                    self.prepare_objects_for_bake(bake_objects, job_name)
+                    # image to bake on
+                    image = self.new_bake_image(self.active_object.name, job_name)
 
-                # image nodes to bake
-                for obj in bake_objects:
-                    for mat_slot in obj.material_slots:
-                        if mat_slot.material:
-                            self.create_bake_image_node(
-                                mat_slot.material, image)
+                    # Bake and Save image!
+                    self.bake_job(self.active_object.name, job_name, image,
+                                  bake_objects, bake_objects)
+
+                self.baked_jobs.add(job_name)
 
-                # Bake and Save image!
-                self.bake_and_save(image, bake_type=get_bake_type(job_name))
+                # append image to image dict for new material
+                new_images[job_name] = image
 
                 # Clean up!
                 for obj in bake_objects:
@@ -1319,32 +2293,51 @@ class PBAKER_OT_bake(bpy.types.Operator):
                 for mat_output in active_outputs:
                     mat_output.is_active_output = True
 
-                # glossiness
-                if job_name == "Roughness" and self.settings.use_invert_roughness:
-                    self.create_gloss_image(obj.name, image)
+                # uniform image -> value in new material
+                if job_name in self.uniform_values:
+                    del new_images[job_name]
+                    bpy.data.images.remove(image)
 
-                # add alpha channel to color
-                if self.settings.use_alpha_to_color and self.settings.color_mode == 'RGBA':
-                    if "Color" in new_images.keys() and "Alpha" in new_images.keys():
-                        new_images["Color"].pixels = get_combined_images(
-                            new_images["Color"], new_images["Alpha"], 0, 3)
-                        new_images["Color"].save()
+                # duplicate image -> share identical image
+                if job_name in self.duplicate_images:
+                    new_images[job_name] = self.duplicate_images.pop(job_name)
+                    bpy.data.images.remove(image)
 
                 # UPDATE progress report
                 progress += 1/len(joblist)
                 bpy.context.window_manager.progress_update(progress)
 
+                yield (self.active_object.name, job_name,
+                       joblist[joblist.index(job_name) + 1:], 0)
+
             # jobs DONE
 
+            # derived outputs
+            derived_images = self.get_post_process_graph(self.active_object.name).run(
+                new_images, self.baked_jobs)
+            self.move_derived_jobs(new_images, derived_images)
+
+            # (optional) all textures in one EXR
+            if self.use_exr_bundle():
+                self.write_exr_bundle(self.active_object.name, new_images, derived_images)
+
             # add new images to new material
             if self.settings.make_new_material:
-                self.add_images_to_material(new_mat, new_images)
+                self.add_images_to_material(
+                    new_mat, new_images,
+                    uv_map=ATLAS_UV_NAME if self.settings.bake_mode == 'ATLAS' else None)
                 self.report(
                     {'INFO'}, "Mew Material created. '{0}'".format(new_mat.name))
 
                 # (optional) add new material
                 if self.settings.add_new_material:
-                    self.active_object.data.materials.append(new_mat)
+                    if self.settings.bake_mode == 'ATLAS':
+                        # one shared material
+                        meshes = dict((obj.data.name, obj.data) for obj in bake_objects)
+                        for mesh in meshes.values():
+                            mesh.materials.append(new_mat)
+                    else:
+                        self.active_object.data.materials.append(new_mat)
 
             # Clean up!
             # 2.80
@@ -1364,6 +2357,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
         # Bake Selected to Active:
         ########
         elif self.settings.bake_mode == 'SELECTED_TO_ACTIVE':
+            self.current_objects = bake_objects + [self.active_object]
 
             # # exclude active object from selected objects
             # if self.active_object in bake_objects:
@@ -1371,43 +2365,33 @@ class PBAKER_OT_bake(bpy.types.Operator):
 
             # Can bake?
             if not self.can_bake(bake_objects):
-                self.final_cleanup()
-                return {'CANCELLED'}
+                self.result = {'CANCELLED'}
+                return
 
             # Can bake? empty material slot in active object
             for mat_slot in self.active_object.material_slots:
                 if not mat_slot.material:
                     self.report(
                         {'INFO'}, "baking cancelled. '{0}' has empty Material Slots.".format(obj.name))
-                    self.final_cleanup()
-                    return {'CANCELLED'}
+                    self.result = {'CANCELLED'}
+                    return
 
             # has active object UV map?
             if self.settings.auto_uv_project == 'OFF':
                 if len(self.active_object.data.uv_layers) == 0:
                     self.report(
                         {'INFO'}, "baking cancelled. '{0}' UV map missing.".format(self.active_object.name))
-                    self.final_cleanup()
-                    return {'CANCELLED'}
+                    self.result = {'CANCELLED'}
+                    return
 
             # Populate joblist
-            joblist = []
-            if self.settings.use_autodetect:
-                joblist = get_joblist_from_objects(bake_objects)
-            else:
-                joblist = get_joblist_manual()
-
-            self.extend_joblist(joblist)
-
-            if self.settings.use_vertex_color:
-                if "Vertex_Color" not in joblist:
-                    joblist.append("Vertex_Color")
+            joblist = self.get_joblist(bake_objects)
 
             # empty joblist -> nothing to do
             if not joblist:
-                self.final_cleanup()
                 self.report({'INFO'}, "Nothing to do.")
-                return {'CANCELLED'}
+                self.result = {'CANCELLED'}
+                return
 
             # BEGIN progress report
             bpy.context.window_manager.progress_begin(0, len(bake_objects))
@@ -1416,6 +2400,7 @@ class PBAKER_OT_bake(bpy.types.Operator):
             # material outpus for later clean up
             active_outputs = get_active_outputs(bake_objects)
             all_material_outputs = get_all_material_outputs(bake_objects)
+            self.all_material_outputs = all_material_outputs
             # 2.80
             if not is_2_79:
                 set_material_outputs_target_to_all(bake_objects)
@@ -1429,59 +2414,52 @@ class PBAKER_OT_bake(bpy.types.Operator):
             if not self.settings.select_uv_map == 'SELECTED':
                 self.select_uv_map(self.active_object)
 
-            # new material
-            new_mat_name = self.active_object.name if self.settings.new_material_prefix == "" else self.settings.new_material_prefix
-            new_mat = self.new_material(new_mat_name)
-            self.active_object.data.materials.append(new_mat)
+            # new material. later preview stages reuse the material of the first stage
+            new_mat = None
+            if not self.reuse_materials:
+                new_mat_name = self.active_object.name if self.settings.new_material_prefix == "" else self.settings.new_material_prefix
+                new_mat = self.new_material(new_mat_name)
+                self.active_object.data.materials.append(new_mat)
 
             # Go through joblist
+            fingerprint_objects = bake_objects + [self.active_object]
             for job_name in joblist:
 
-                # skip, if no overwrite and image exists. load existing image
+                # skip, if no overwrite and image exists or unchanged. load existing image
+                # jobs baked with a former job are not skipped - see bake_multiplexed_jobs()
                 image_file_name = self.get_image_file_name(
                     self.active_object.name, job_name)
-                if not self.settings.use_overwrite and self.is_image_file(image_file_name):
-                    self.report({'INFO'}, "baking skipped for '{0}'. File exists.".format(
-                        self.get_image_file_name(obj.name, job_name)))
+                if job_name not in self.multiplexed_images and \
+                        self.skip_job(image_file_name, fingerprint_objects, job_name,
+                                      image_objects=[self.active_object]):
 
-                    # load image for new material
-                    new_images[job_name] = self.load_image(image_file_name)
+                    # load image for new material. UDIM: first tile
+                    new_images[job_name] = self.load_image(
+                        self.get_output_file_names(image_file_name, [self.active_object])[0])
 
                     continue  # skip job
 
                 # else: do bake
-                # image to bake on
-                image = self.new_bake_image(self.active_object.name, job_name)
-
-                # append image to image dict for new material
-                new_images[job_name] = image
-
-                # temp material for vertex color
-                if self.settings.use_vertex_color:
-                    for obj in bake_objects:
-                        if not has_material(obj):
-                            add_temp_material(obj)
-
-                # Prepare materials
-                if job_name == 'MatID':
-                    self.prepare_objects_for_bake_matid(bake_objects)
-                elif job_name == 'Vertex_Color':
-                    self.prepare_objects_for_bake_vertex_color(bake_objects)
-                elif job_name == 'Wireframe':
-                    self.prepare_objects_for_bake_wireframe(bake_objects)
-                elif job_name == 'Diffuse':
-                    pass  # prepare nothing
+                if self.can_multiplex(job_name):
+                    # bake with next scalar jobs in one pass
+                    if job_name not in self.multiplexed_images:
+                        job_names = self.get_multiplex_jobs(
+                            joblist, job_name, self.active_object.name, fingerprint_objects)
+                        self.multiplexed_images = self.bake_multiplexed_jobs(
+                            job_names, self.active_object.name, bake_objects, [self.active_object], selected_to_active=True)
+                    image = self.multiplexed_images.pop(job_name)
                 else:
-                    self.prepare_objects_for_bake(bake_objects, job_name)
+                    # image to bake on
+                    image = self.new_bake_image(self.active_object.name, job_name)
+
+                    # Bake and Save image!
+                    self.bake_job(self.active_object.name, job_name, image, bake_objects,
+                                  [self.active_object], selected_to_active=True)
 
-                # image nodes to bake
-                for mat_slot in self.active_object.material_slots:
-                    if mat_slot.material:
-                        self.create_bake_image_node(mat_slot.material, image)
+                self.baked_jobs.add(job_name)
 
-                # Bake and Save image!
-                self.bake_and_save(image, bake_type=get_bake_type(
-                    job_name), selected_to_active=True)
+                # append image to image dict for new material
+                new_images[job_name] = image
 
                 # Clean up!
                 for obj in bake_objects:
@@ -1512,27 +2490,39 @@ class PBAKER_OT_bake(bpy.types.Operator):
                     uv_layers = obj.data.uv_textures if is_2_79 else obj.data.uv_layers
                     uv_layers.active_index = orig_uv_layers_active_index
 
-                # glossiness
-                if job_name == "Roughness" and self.settings.use_invert_roughness:
-                    self.create_gloss_image(self.active_object.name, image)
+                # uniform image -> value in new material
+                if job_name in self.uniform_values:
+                    del new_images[job_name]
+                    bpy.data.images.remove(image)
 
-                # add alpha channel to color
-                if self.settings.use_alpha_to_color and self.settings.color_mode == 'RGBA':
-                    if "Color" in new_images.keys() and "Alpha" in new_images.keys():
-                        new_images["Color"].pixels = get_combined_images(
-                            new_images["Color"], new_images["Alpha"], 0, 3)
-                        new_images["Color"].save()
+                # duplicate image -> share identical image
+                if job_name in self.duplicate_images:
+                    new_images[job_name] = self.duplicate_images.pop(job_name)
+                    bpy.data.images.remove(image)
 
                 # UPDATE progress report
                 progress += 1/len(joblist)
                 bpy.context.window_manager.progress_update(progress)
 
+                yield (self.active_object.name, job_name,
+                       joblist[joblist.index(job_name) + 1:], 0)
+
             # jobs DONE
 
+            # derived outputs
+            derived_images = self.get_post_process_graph(self.active_object.name).run(
+                new_images, self.baked_jobs)
+            self.move_derived_jobs(new_images, derived_images)
+
+            # (optional) all textures in one EXR
+            if self.use_exr_bundle():
+                self.write_exr_bundle(self.active_object.name, new_images, derived_images)
+
             # add new images to new material
-            self.add_images_to_material(new_mat, new_images)
-            self.report(
-                {'INFO'}, "Mew Material created. '{0}'".format(new_mat.name))
+            if new_mat:
+                self.add_images_to_material(new_mat, new_images)
+                self.report(
+                    {'INFO'}, "Mew Material created. '{0}'".format(new_mat.name))
 
             # Clean up!
             # 2.80
@@ -1541,13 +2531,300 @@ class PBAKER_OT_bake(bpy.types.Operator):
                     mat_output.target = target
 
             # remove tag from new material
-            if self.settings.make_new_material:
+            if self.settings.make_new_material and new_mat:
                 if MATERIAL_TAG in new_mat:
                     del(new_mat[MATERIAL_TAG])
 
             # END progress report
             bpy.context.window_manager.progress_end()
 
+    def abort_bake(self):
+        """clean up of an object, which was interrupted between jobs"""
+        # 2.80
+        if is_2_80:
+            for mat_output, target in self.all_material_outputs.items():
+                mat_output.target = target
+        bpy.context.window_manager.progress_end()
+
+        # remove tag from new materials
+        for mat in bpy.data.materials:
+            if MATERIAL_TAG in mat.keys():
+                del(mat[MATERIAL_TAG])
+
+    # def excecute(self, context):
+    def invoke(self, context, event):
+        cancelled = self.setup(context)
+        if cancelled:
+            return cancelled
+
+        # hidden objects and other temporary changes are restored, even if a bake fails
+        try:
+            for step in self.bake_steps():
+                pass
+        finally:
+            self.final_cleanup()
+        return self.result
+
+
+class PBAKER_OT_bake_modal(PBAKER_OT_bake):
+    bl_idname = "object.principled_baker_bake_modal"
+    bl_label = "Bake in Background"
+    bl_description = "bake job by job without blocking the interface. ESC: cancel, P: pause/resume"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def invoke(self, context, event):
+        cancelled = self.setup(context)
+        if cancelled:
+            return cancelled
+
+        self.steps = self.bake_steps()
+        self.paused = False
+        self.step_times = []
+        self.jobs_done = 0
+        self.update_queue(context, "Starting...", [], 0)
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.steps.close()
+            self.abort_bake()
+            self.finish(context)
+            self.report({'WARNING'}, "Baking cancelled after {} jobs.".format(
+                self.jobs_done))
+            return {'CANCELLED'}
+
+        if event.type == 'P' and event.value == 'PRESS':
+            self.paused = not self.paused
+            status = "Paused" if self.paused else "Resumed"
+            self.update_queue(context, status, self.remaining_jobs, 0)
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'TIMER' and not self.paused:
+            start = time.time()
+            try:
+                object_name, job_name, remaining_jobs, remaining_objects = next(
+                    self.steps)
+            except StopIteration:
+                self.finish(context)
+                return self.result
+            except Exception:
+                # hidden objects and other temporary changes are restored
+                self.abort_bake()
+                self.finish(context)
+                raise
+            self.step_times.append(time.time() - start)
+            self.jobs_done += 1
+
+            # estimate jobs of remaining objects by jobs of current object
+            jobs_per_object = self.jobs_done + len(remaining_jobs)
+            status = "'{0}' {1} done".format(object_name, job_name)
+            self.update_queue(context, status, remaining_jobs,
+                              remaining_objects * jobs_per_object)
+
+        return {'PASS_THROUGH'}
+
+    def update_queue(self, context, status, remaining_jobs, more_jobs):
+        """list remaining jobs with ETA in panel"""
+        self.remaining_jobs = remaining_jobs
+        average_time = sum(self.step_times) / \
+            len(self.step_times) if self.step_times else 0.0
+
+        queue = context.scene.principled_baker_queue
+        queue.clear()
+        eta = 0.0
+        for job_name in remaining_jobs:
+            predicted = self.predict_job_time(job_name, self.current_objects)
+            eta += average_time if predicted is None else predicted
+            item = queue.add()
+            item.name = job_name
+            item.eta = eta
+        total_eta = eta + more_jobs * average_time
+        if self.paused:
+            status = "Paused"
+        context.scene.principled_baker_queue_status = "{0} - {1} jobs done, ETA {2:.0f}s".format(
+            status, self.jobs_done, total_eta)
+
+        for area in context.screen.areas:
+            if area.type == 'NODE_EDITOR':
+                area.tag_redraw()
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.scene.principled_baker_queue.clear()
+        context.scene.principled_baker_queue_status = ""
         self.final_cleanup()
 
+
+class PBAKER_OT_bake_preview(PBAKER_OT_bake_modal):
+    bl_idname = "object.principled_baker_bake_preview"
+    bl_label = "Preview Bake"
+    bl_description = "bake at 1/8 resolution and 1 sample, then rebake up to full resolution in the background. ESC: cancel, P: pause/resume"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def get_stage_settings(self, settings, stage, resolution, divisor, stage_dir):
+        values = {}
+        if stage > 0:
+            # the images of the first stage are replaced - see replace_preview_images()
+            values['make_new_material'] = False
+        if divisor > 1:
+            values.update(
+                file_path=stage_dir,
+                resolution='CUSTOM',
+                custom_resolution=max(1, resolution // divisor),
+                samples=1 if stage == 0 else max(1, settings.samples // divisor),
+                use_overwrite=True,
+                use_incremental=False,
+                use_tile_calibration=False,
+                measure_isolation=False,
+                measure_denoise=False)
+        return SettingsOverride(settings, **values)
+
+    def replace_preview_images(self, preview_images, stage_images):
+        """load the files of the current stage into the images of the new material.
+        preview_images: {name in a stage: image}"""
+        stage_images = dict((image.name, image) for image in stage_images)
+        for name, image in preview_images.items():
+            stage_image = stage_images.get(name)
+            if not stage_image:
+                continue
+            if not stage_image.packed_file and os.path.isfile(bpy.path.abspath(stage_image.filepath)):
+                # reload() of a generated image would generate it again
+                image.filepath = stage_image.filepath
+                image.source = 'FILE'
+                image.reload()
+            else:
+                image.scale(stage_image.size[0], stage_image.size[1])
+                set_image_pixels(image, get_image_pixels(stage_image))
+                if image.packed_file:
+                    if is_2_79:
+                        image.pack(as_png=True)
+                    else:
+                        image.pack()
+        for image in stage_images.values():
+            bpy.data.images.remove(image)
+
+    def pack_stage_images(self, images, stage_dir):
+        """images still loaded from stage_dir, e.g. of a cancelled preview, are packed
+        before stage_dir is removed"""
+        for image in images:
+            if image.packed_file:
+                continue
+            if not os.path.abspath(bpy.path.abspath(image.filepath)).startswith(stage_dir):
+                continue
+            if is_2_79:
+                image.pack(as_png=True)
+            elif image.source == 'FILE':
+                image.pack()
+
+    def bake_steps(self):
+        """bakes all jobs once per stage of PREVIEW_STAGES. Stages below full resolution
+        are written to a temporary directory, not to the outputs"""
+        settings = self.settings
+        output_dir, output_index = self.output_dir, self.output_index
+        image_aliases = self.image_aliases
+        stage_dir = tempfile.mkdtemp(prefix="pbaker_preview_")
+        resolution = self.get_resolution()
+        preview_images = {}
+        try:
+            for stage, divisor in enumerate(PREVIEW_STAGES):
+                self.settings = self.get_stage_settings(
+                    settings, stage, resolution, divisor, stage_dir)
+                if divisor > 1:
+                    self.output_dir, self.output_index = stage_dir, DirectoryIndex(stage_dir)
+                    # aliases of stage files are not written to the manifest
+                    self.image_aliases = dict(image_aliases)
+                else:
+                    self.output_dir, self.output_index = output_dir, output_index
+                    self.image_aliases = image_aliases
+                # images of former stages are no duplicates
+                self.image_digests = {}
+                self.duplicate_images = {}
+                self.reuse_materials = stage > 0
+                self.udim_plans.clear()
+                image_names = set(bpy.data.images.keys())
+
+                yield from PBAKER_OT_bake_modal.bake_steps(self)
+                if self.result == {'CANCELLED'}:
+                    return
+
+                stage_images = [i for i in bpy.data.images if i.name not in image_names]
+                if stage == 0:
+                    # images of later stages replace images of the same name
+                    preview_images = dict((image.name, image) for image in stage_images)
+                    for image in stage_images:
+                        image.name = "{} (preview)".format(image.name)
+                else:
+                    self.replace_preview_images(preview_images, stage_images)
+                self.report({'INFO'}, "Preview stage {0}/{1} done. {2}px".format(
+                    stage + 1, len(PREVIEW_STAGES), self.get_resolution()))
+        finally:
+            # images of a cancelled stage
+            if preview_images:
+                for image in [i for i in bpy.data.images if i.name not in image_names]:
+                    bpy.data.images.remove(image)
+            for name, image in preview_images.items():
+                image.name = name
+            self.pack_stage_images(bpy.data.images, stage_dir)
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            self.output_dir, self.output_index = output_dir, output_index
+            self.image_aliases = image_aliases
+            self.reuse_materials = False
+            self.settings = settings
+
+
+class PBAKER_OT_check_changes(PBAKER_OT_bake):
+    bl_idname = "object.principled_baker_check_changes"
+    bl_label = "Check Changes"
+    bl_description = "List textures which are missing or outdated and will be baked"
+    bl_options = {'REGISTER'}
+
+    def invoke(self, context, event):
+        self.init_settings(context)
+
+        dirty_jobs = context.scene.principled_baker_dirty_jobs
+        dirty_jobs.clear()
+
+        if not bpy.data.is_saved:
+            self.report(
+                {'ERROR'}, 'Blendfile needs to be saved to get relative output paths')
+            return {'CANCELLED'}
+        if not self.check_file_path():
+            self.report({'ERROR'},
+                        "'{}' Permission denied".format(self.settings.file_path))
+            return {'CANCELLED'}
+        self.read_manifest()
+
+        bake_objects = get_only_meshes(self.selected_objects)
+        if self.settings.bake_mode == 'SELECTED_TO_ACTIVE':
+            if self.active_object in bake_objects:
+                bake_objects.remove(self.active_object)
+
+        # before autodetect alters materials
+        self.prepare_fingerprints(self.selected_objects)
+        self.udim_plans = {}
+
+        # (name, objects to bake, objects with influence on the result, objects baked to)
+        if self.settings.bake_mode == 'BATCH':
+            groups = [(obj.name, [obj], [obj], [obj]) for obj in bake_objects]
+        elif self.settings.bake_mode in ['COMBINED', 'ATLAS']:
+            groups = [(self.active_object.name, bake_objects, bake_objects, bake_objects)]
+        else:
+            groups = [(self.active_object.name, bake_objects,
+                       bake_objects + [self.active_object], [self.active_object])]
+
+        for name, objects, fingerprint_objects, image_objects in groups:
+            for job_name in self.get_joblist(objects):
+                image_file_name = self.get_image_file_name(name, job_name)
+                reason = self.get_dirty_reason(
+                    image_file_name, fingerprint_objects, job_name, image_objects)
+                if reason:
+                    item = dirty_jobs.add()
+                    item.name = image_file_name
+                    item.reason = reason
+
+        self.report({'INFO'}, "{} textures to bake.".format(len(dirty_jobs)))
         return {'FINISHED'}
@@ -0,0 +1,214 @@
+import struct
+
+import numpy
+
+
+DDS_FOURCC = {
+    'BC1': b'DXT1',
+    'BC3': b'DXT5',
+    'BC4': b'ATI1',
+    'BC5': b'ATI2',
+}
+
+# blocks encoded at once, limits memory for large images
+DDS_CHUNK_BLOCKS = 65536
+
+# palette weights of endpoint 0
+BC1_WEIGHTS = numpy.array([1.0, 0.0, 2 / 3, 1 / 3], dtype=numpy.float32)
+BC4_WEIGHTS = numpy.array([1.0, 0.0, 6 / 7, 5 / 7, 4 / 7, 3 / 7, 2 / 7, 1 / 7],
+                          dtype=numpy.float32)
+
+
+def get_blocks(a):
+    """(height, width, channels) to (blocks, 16, channels), 4x4 blocks row by row"""
+    height, width, channels = a.shape
+    pad_y, pad_x = (-height) % 4, (-width) % 4
+    if pad_y or pad_x:
+        a = numpy.pad(a, ((0, pad_y), (0, pad_x), (0, 0)), mode='edge')
+        height, width = a.shape[:2]
+    a = a.reshape(height // 4, 4, width // 4, 4, channels)
+    return a.transpose(0, 2, 1, 3, 4).reshape(-1, 16, channels)
+
+
+def get_principal_axis(colors, iterations=4):
+    """principal axis of the colors of each block by power iteration"""
+    centered = colors - colors.mean(axis=1)[:, None, :]
+    cov = numpy.einsum('nki,nkj->nij', centered, centered)
+    # start with the column of the channel of largest variance
+    channel = cov[:, [0, 1, 2], [0, 1, 2]].argmax(axis=1)
+    axis = cov[numpy.arange(cov.shape[0]), :, channel]
+    for i in range(iterations):
+        norm = numpy.sqrt((axis * axis).sum(axis=1))[:, None]
+        axis = axis / numpy.maximum(norm, 1e-12)
+        axis = numpy.einsum('nij,nj->ni', cov, axis)
+    norm = numpy.sqrt((axis * axis).sum(axis=1))[:, None]
+    return axis / numpy.maximum(norm, 1e-12)
+
+
+def refine_endpoints(values, indices, weights, e0, e1):
+    """least squares endpoints for given palette indices"""
+    w = weights[indices][:, :, None]
+    a = (w * w).sum(axis=1)
+    b = (w * (1 - w)).sum(axis=1)
+    c = ((1 - w) * (1 - w)).sum(axis=1)
+    x = (w * values).sum(axis=1)
+    y = ((1 - w) * values).sum(axis=1)
+    det = a * c - b * b
+    valid = numpy.abs(det) > 1e-6
+    safe_det = numpy.where(valid, det, 1.0)
+    new_e0 = numpy.where(valid, (c * x - b * y) / safe_det, e0)
+    new_e1 = numpy.where(valid, (a * y - b * x) / safe_det, e1)
+    return numpy.clip(new_e0, 0, 1), numpy.clip(new_e1, 0, 1)
+
+
+def to_565(c):
+    r = numpy.round(c[:, 0] * 31).astype(numpy.uint16)
+    g = numpy.round(c[:, 1] * 63).astype(numpy.uint16)
+    b = numpy.round(c[:, 2] * 31).astype(numpy.uint16)
+    return (r << 11) | (g << 5) | b
+
+
+def from_565(v):
+    r = (v >> 11) & 31
+    g = (v >> 5) & 63
+    b = v & 31
+    return numpy.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)],
+                       axis=1).astype(numpy.float32) / 255
+
+
+def get_nearest(values, palette):
+    """index of nearest palette entry. values (n, 16, c), palette (n, p, c)"""
+    dist = numpy.stack([((values - palette[:, i, None, :]) ** 2).sum(axis=2)
+                        for i in range(palette.shape[1])], axis=2)
+    return dist.argmin(axis=2)
+
+
+def get_bc1_palette(c0, c1):
+    p0 = from_565(c0)
+    p1 = from_565(c1)
+    return numpy.stack([p0, p1, (2 * p0 + p1) / 3, (p0 + 2 * p1) / 3], axis=1)
+
+
+def encode_bc1_blocks(colors, quality):
+    """colors (n, 16, 3). returns (n, 8) uint8"""
+    if quality:
+        mean = colors.mean(axis=1)
+        axis = get_principal_axis(colors)
+        proj = numpy.einsum('nki,ni->nk', colors - mean[:, None, :], axis)
+        e0 = mean + axis * proj.max(axis=1)[:, None]
+        e1 = mean + axis * proj.min(axis=1)[:, None]
+    else:
+        # bounding box, inset to reduce error of the extremes
+        high = colors.max(axis=1)
+        low = colors.min(axis=1)
+        inset = (high - low) / 16
+        e0 = high - inset
+        e1 = low + inset
+    e0 = numpy.clip(e0, 0, 1)
+    e1 = numpy.clip(e1, 0, 1)
+
+    if quality:
+        indices = get_nearest(colors, get_bc1_palette(to_565(e0), to_565(e1)))
+        e0, e1 = refine_endpoints(colors, indices, BC1_WEIGHTS, e0, e1)
+
+    c0 = to_565(e0)
+    c1 = to_565(e1)
+    # 4 color mode needs c0 > c1
+    swap = c0 < c1
+    c0, c1 = numpy.where(swap, c1, c0), numpy.where(swap, c0, c1)
+
+    indices = get_nearest(colors, get_bc1_palette(c0, c1))
+    indices[c0 == c1] = 0
+    shifts = numpy.arange(16, dtype=numpy.uint32) * 2
+    bits = (indices.astype(numpy.uint32) << shifts).sum(axis=1).astype(numpy.uint32)
+
+    blocks = numpy.empty(colors.shape[0], dtype=[
+        ('c0', '<u2'), ('c1', '<u2'), ('bits', '<u4')])
+    blocks['c0'] = c0
+    blocks['c1'] = c1
+    blocks['bits'] = bits
+    return blocks.view(numpy.uint8).reshape(-1, 8)
+
+
+def get_bc4_palette(r0, r1):
+    r0 = r0.astype(numpy.float32)[:, None]
+    r1 = r1.astype(numpy.float32)[:, None]
+    return (BC4_WEIGHTS * r0 + (1 - BC4_WEIGHTS) * r1)[:, :, None] / 255
+
+
+def encode_bc4_blocks(values, quality):
+    """values (n, 16). returns (n, 8) uint8"""
+    values = values[:, :, None]
+    e0 = values.max(axis=1)
+    e1 = values.min(axis=1)
+
+    if quality:
+        r0 = numpy.round(e0[:, 0] * 255)
+        r1 = numpy.round(e1[:, 0] * 255)
+        indices = get_nearest(values, get_bc4_palette(r0, r1))
+        e0, e1 = refine_endpoints(values, indices, BC4_WEIGHTS, e0, e1)
+
+    # 8 value mode needs r0 > r1
+    r0 = numpy.round(numpy.maximum(e0, e1)[:, 0] * 255).astype(numpy.uint8)
+    r1 = numpy.round(numpy.minimum(e0, e1)[:, 0] * 255).astype(numpy.uint8)
+
+    indices = get_nearest(values, get_bc4_palette(r0, r1))
+    indices[r0 == r1] = 0
+    shifts = numpy.arange(16, dtype=numpy.uint64) * 3
+    bits = (indices.astype(numpy.uint64) << shifts).sum(axis=1).astype('<u8')
+
+    blocks = numpy.empty((values.shape[0], 8), dtype=numpy.uint8)
+    blocks[:, 0] = r0
+    blocks[:, 1] = r1
+    blocks[:, 2:] = bits.view(numpy.uint8).reshape(-1, 8)[:, :6]
+    return blocks
+
+
+def encode_blocks(blocks, dds_format, quality):
+    """blocks (n, 16, 4) float. returns (n, block size) uint8"""
+    if dds_format == 'BC1':
+        return encode_bc1_blocks(blocks[:, :, 0:3], quality)
+    if dds_format == 'BC3':
+        return numpy.concatenate([encode_bc4_blocks(blocks[:, :, 3], quality),
+                                  encode_bc1_blocks(blocks[:, :, 0:3], quality)], axis=1)
+    if dds_format == 'BC4':
+        return encode_bc4_blocks(blocks[:, :, 0], quality)
+    if dds_format == 'BC5':
+        return numpy.concatenate([encode_bc4_blocks(blocks[:, :, 0], quality),
+                                  encode_bc4_blocks(blocks[:, :, 1], quality)], axis=1)
+    raise ValueError("unknown DDS format {}".format(dds_format))
+
+
+def encode_dds_image(pixels, dds_format, quality=False):
+    """pixels (height, width, 4) float 0..1, top row first. returns encoded bytes"""
+    blocks = get_blocks(numpy.clip(pixels, 0, 1).astype(numpy.float32))
+    data = []
+    for start in range(0, blocks.shape[0], DDS_CHUNK_BLOCKS):
+        data.append(encode_blocks(
+            blocks[start:start + DDS_CHUNK_BLOCKS], dds_format, quality).tobytes())
+    return b''.join(data)
+
+
+def write_dds(file_path, width, height, dds_format, levels):
+    """levels: encoded data of the image and its mipmaps"""
+    DDSD_CAPS, DDSD_HEIGHT, DDSD_WIDTH = 0x1, 0x2, 0x4
+    DDSD_PIXELFORMAT, DDSD_MIPMAPCOUNT, DDSD_LINEARSIZE = 0x1000, 0x20000, 0x80000
+    DDPF_FOURCC = 0x4
+    DDSCAPS_COMPLEX, DDSCAPS_TEXTURE, DDSCAPS_MIPMAP = 0x8, 0x1000, 0x400000
+
+    flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT | DDSD_LINEARSIZE
+    caps = DDSCAPS_TEXTURE
+    if len(levels) > 1:
+        flags |= DDSD_MIPMAPCOUNT
+        caps |= DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
+
+    header = struct.pack('<4s7I44x', b'DDS ', 124, flags, height, width,
+                         len(levels[0]), 0, len(levels))
+    pixel_format = struct.pack('<2I4s5I', 32, DDPF_FOURCC, DDS_FOURCC[dds_format],
+                               0, 0, 0, 0, 0)
+    caps_data = struct.pack('<4I4x', caps, 0, 0, 0)
+
+    with open(file_path, 'wb') as f:
+        f.write(header + pixel_format + caps_data)
+        for data in levels:
+            f.write(data)
@@ -0,0 +1,134 @@
+import struct
+import zlib
+
+import numpy
+
+
+EXR_MAGIC = 20000630
+EXR_VERSION = 2
+EXR_LONG_NAMES = 0x400
+EXR_MULTI_PART = 0x1000
+
+EXR_PIXEL_TYPES = {
+    'HALF': (1, '<f2'),
+    'FLOAT': (2, '<f4'),
+}
+
+# compression: (id, scanlines per chunk)
+EXR_COMPRESSIONS = {
+    'NONE': (0, 1),
+    'ZIPS': (2, 1),
+    'ZIP': (3, 16),
+}
+
+
+def exr_attribute(name, attr_type, data):
+    return name.encode('utf-8') + b'\0' + attr_type.encode('utf-8') + b'\0' + \
+        struct.pack('<i', len(data)) + data
+
+
+def exr_zip_compress(raw):
+    """interleave bytes, delta predictor, zlib. returns raw data, if not smaller"""
+    a = numpy.frombuffer(raw, dtype=numpy.uint8)
+    t = numpy.concatenate((a[0::2], a[1::2])).astype(numpy.int16)
+    d = numpy.empty_like(t)
+    d[0] = t[0]
+    d[1:] = (t[1:] - t[:-1] + 128) % 256
+    compressed = zlib.compress(d.astype(numpy.uint8).tobytes())
+    if len(compressed) < len(raw):
+        return compressed
+    return raw
+
+
+class MultiPartExrLayer():
+    def __init__(self, name, width, height, channels):
+        self.name = name
+        self.width = width
+        self.height = height
+        # channel name: index in RGBA pixels, sorted by name as stored in EXR
+        self.channels = sorted(
+            ("{}.{}".format(name, c), i) for c, i in channels)
+
+
+class MultiPartExrWriter():
+    """Writes images as parts of one multi-part EXR, one layer at a time.
+    Headers and offset tables are written first, offsets are filled in on close()"""
+
+    def __init__(self, file_path, layers, pixel_type='HALF', compression='ZIP'):
+        self.layers = layers
+        self.pixel_type, self.dtype = EXR_PIXEL_TYPES[pixel_type]
+        self.compression, self.lines_per_chunk = EXR_COMPRESSIONS[compression]
+        self.offsets = [[] for layer in layers]
+
+        self.file = open(file_path, 'wb')
+        self.write_headers()
+
+        # placeholder offset tables
+        self.offset_table_pos = self.file.tell()
+        for layer in layers:
+            self.file.write(b'\0' * 8 * self.get_chunk_count(layer))
+
+    def get_chunk_count(self, layer):
+        return (layer.height + self.lines_per_chunk - 1) // self.lines_per_chunk
+
+    def write_headers(self):
+        names = [layer.name for layer in self.layers] + \
+            [name for layer in self.layers for name, i in layer.channels]
+        flags = EXR_MULTI_PART
+        if max(len(name) for name in names) > 31:
+            flags |= EXR_LONG_NAMES
+
+        # displayWindow must be the same for all parts
+        display_window = struct.pack('<iiii', 0, 0,
+                                     max(layer.width for layer in self.layers) - 1,
+                                     max(layer.height for layer in self.layers) - 1)
+
+        f = self.file
+        f.write(struct.pack('<ii', EXR_MAGIC, EXR_VERSION | flags))
+        for layer in self.layers:
+            chlist = b''
+            for name, i in layer.channels:
+                chlist += name.encode('utf-8') + b'\0' + \
+                    struct.pack('<iB3xii', self.pixel_type, 0, 1, 1)
+            chlist += b'\0'
+            data_window = struct.pack('<iiii', 0, 0, layer.width - 1, layer.height - 1)
+
+            f.write(exr_attribute('channels', 'chlist', chlist))
+            f.write(exr_attribute('chunkCount', 'int',
+                                  struct.pack('<i', self.get_chunk_count(layer))))
+            f.write(exr_attribute('compression', 'compression',
+                                  struct.pack('<B', self.compression)))
+            f.write(exr_attribute('dataWindow', 'box2i', data_window))
+            f.write(exr_attribute('displayWindow', 'box2i', display_window))
+            f.write(exr_attribute('lineOrder', 'lineOrder', b'\0'))
+            f.write(exr_attribute('name', 'string', layer.name.encode('utf-8')))
+            f.write(exr_attribute('pixelAspectRatio', 'float', struct.pack('<f', 1.0)))
+            f.write(exr_attribute('screenWindowCenter', 'v2f', struct.pack('<ff', 0.0, 0.0)))
+            f.write(exr_attribute('screenWindowWidth', 'float', struct.pack('<f', 1.0)))
+            f.write(exr_attribute('type', 'string', b'scanlineimage'))
+            f.write(b'\0')  # end of header
+        f.write(b'\0')  # end of headers
+
+    def write_layer(self, index, pixels):
+        """pixels: float array (width * height, 4), bottom row first as in Blender"""
+        layer = self.layers[index]
+        rows = numpy.asarray(pixels).reshape(layer.height, layer.width, 4)[::-1]
+        channel_indices = [i for name, i in layer.channels]
+
+        for y in range(0, layer.height, self.lines_per_chunk):
+            block = rows[y:y + self.lines_per_chunk][:, :, channel_indices]
+            # per scanline: all values of one channel, then the next channel
+            data = numpy.ascontiguousarray(
+                block.transpose(0, 2, 1)).astype(self.dtype).tobytes()
+            if self.compression:
+                data = exr_zip_compress(data)
+
+            self.offsets[index].append(self.file.tell())
+            self.file.write(struct.pack('<iii', index, y, len(data)))
+            self.file.write(data)
+
+    def close(self):
+        self.file.seek(self.offset_table_pos)
+        for offsets in self.offsets:
+            self.file.write(struct.pack('<{}Q'.format(len(offsets)), *offsets))
+        self.file.close()
@@ -1,9 +1,14 @@
+import hashlib
+import json
 import os
 import time
+import zlib
 
 import bpy
 import numpy
 
+from .pbaker_dds import encode_dds_image, write_dds
+
 is_2_79 = True if bpy.app.version_string.startswith('2.7') else False
 is_2_80 = True if bpy.app.version_string.startswith('2.8') else False
 
@@ -40,8 +45,57 @@ if is_2_80:
 
 NORMAL_INPUTS = ['Normal', 'Clearcoat Normal', 'Tangent']
 
+# inputs with a default value, that can be compared
+VALUE_INPUTS = [
+    i for i in NODE_INPUTS if i not in ['Subsurface Radius'] + NORMAL_INPUTS]
+
+# grayscale inputs, can be baked together in R, G and B of one image
+SCALAR_INPUTS = [
+    'Subsurface',
+    'Metallic',
+    'Specular',
+    'Specular Tint',
+    'Roughness',
+    'Anisotropic',
+    'Anisotropic Rotation',
+    'Sheen',
+    'Sheen Tint',
+    'Clearcoat',
+    'Clearcoat Roughness',
+    'IOR',
+    'Transmission',
+    'Transmission Roughness',
+]
+
 SRGB_INPUTS = ['Color', 'Base Color']
 
+# normal map conventions: name, suffix, axes of R, G and B
+NORMAL_CONVENTIONS = {
+    'OPENGL': ("OpenGL", "_GL", ('POS_X', 'POS_Y', 'POS_Z')),
+    'DIRECTX': ("DirectX", "_DX", ('POS_X', 'NEG_Y', 'POS_Z')),
+}
+
+NORMAL_MAP_JOBS = ['Normal', 'Clearcoat Normal']
+
+# convention variant: (normal map job, convention)
+NORMAL_VARIANT_JOBS = {
+    "{0} {1}".format(job_name, NORMAL_CONVENTIONS[c][0]): (job_name, c)
+    for job_name in NORMAL_MAP_JOBS for c in NORMAL_CONVENTIONS}
+
+# alpha tested jobs, mipmaps keep their coverage
+ALPHA_JOBS = ['Alpha', 'Translucent_Alpha', 'Glass_Alpha']
+
+# jobs written as single channel DDS (BC4)
+GRAYSCALE_JOBS = SCALAR_INPUTS + ALPHA_JOBS + [
+    'Ambient Occlusion',
+    'Displacement',
+    'Bump',
+    'Glossiness',
+    'Wireframe',
+    'Curvature',
+    'Cavity',
+]
+
 ALPHA_NODES = {  # TODO 'BSDF_TRANSPARENT' in alpha nodes?
     # "Alpha":'BSDF_TRANSPARENT',
     "Translucent_Alpha": 'BSDF_TRANSLUCENT',
@@ -70,8 +124,18 @@ IMAGE_FILE_FORMAT_ENDINGS = {
     "TIFF": "tif",
     "TARGA": "tga",
     "OPEN_EXR": "exr",
+    "DDS": "dds",
 }
 
+# pixels tested at once, limits memory of UV coverage masks
+COVERAGE_CHUNK_PIXELS = 1 << 22
+
+UDIM_FIRST_TILE = 1001
+
+# UV map of the ATLAS bake mode
+ATLAS_UV_NAME = "PBAKER_ATLAS"
+MAX_UV_MAPS = 8
+
 NODE_OFFSET_X = 300
 NODE_OFFSET_Y = 200
 
@@ -79,8 +143,76 @@ IMAGE_NODE_OFFSET_X = -900
 IMAGE_NODE_OFFSET_Y = -260
 IMAGE_NODE_WIDTH = 300
 
+MANIFEST_FILE_NAME = "principled_baker_manifest.json"
+
+# node properties without influence on bake results
+FINGERPRINT_IGNORE_PROPERTIES = [
+    'rna_type', 'name', 'label', 'location', 'width', 'width_hidden', 'height',
+    'dimensions', 'select', 'show_options', 'show_preview', 'show_texture',
+    'hide', 'color', 'use_custom_color', 'label_size', 'shrink', 'text',
+    'bl_idname', 'bl_label', 'bl_description', 'bl_icon', 'bl_static_type',
+    'bl_width_default', 'bl_width_min', 'bl_width_max',
+    'bl_height_default', 'bl_height_min', 'bl_height_max',
+]
+
+# settings, which alter the pixels or files of all jobs. File names are not included,
+# fingerprints are stored per file. See get_job_settings() for settings of some jobs
+FINGERPRINT_SETTINGS = [
+    'file_format', 'color_mode', 'color_depth', 'compression', 'exr_codec', 'use_exr_bundle',
+    'use_mipmaps', 'dds_quality', 'tiff_codec', 'quality', 'resolution', 'custom_resolution',
+    'use_udim', 'use_udim_density', 'margin', 'samples', 'use_uniform_detection',
+    'uniform_tolerance', 'uniform_output', 'use_deduplication', 'bake_mode', 'atlas_margin',
+    'select_uv_map', 'auto_uv_project', 'angle_limit', 'island_margin', 'user_area_weight',
+    'use_aspect', 'stretch_to_bounds', 'share_tex_space', 'new_uv_map', 'image_size',
+    'pack_quality', 'lightmap_margin', 'auto_smooth',
+]
+
+# max. number of outdated textures in panel
+MAX_DIRTY_JOBS_SHOWN = 10
+
+TILE_CALIBRATION_FILE_NAME = "principled_baker_tile_calibration.json"
+TIMING_DB_FILE_NAME = "principled_baker_timings.json"
+MAX_TIMING_RECORDS = 20
+
+# candidate tile sizes per device
+TILE_SIZES = {
+    'CPU': [16, 32, 64],
+    'GPU': [128, 256, 512],
+}
+# candidate thread counts per device, shares of the default thread count
+THREAD_SHARES = {
+    'CPU': [1.0, 0.5],
+    'GPU': [1.0],
+}
+
+# Diffuse pass: component job
+DIFFUSE_COMPONENTS = {
+    'DIRECT': "Diffuse Direct",
+    'INDIRECT': "Diffuse Indirect",
+    'COLOR': "Diffuse Color",
+}
+DIFFUSE_COMPONENT_JOBS = {job_name: p for p, job_name in DIFFUSE_COMPONENTS.items()}
+
+# variant: (job, passes), composed from the components
+DIFFUSE_VARIANTS = {
+    'LIT': ("Diffuse Lit", ('DIRECT', 'INDIRECT', 'COLOR')),
+    'UNLIT': ("Diffuse Unlit", ('COLOR',)),
+    'LIGHTING': ("Diffuse Lighting", ('DIRECT', 'INDIRECT')),
+}
+DIFFUSE_VARIANT_JOBS = {job_name: v for v, (job_name, passes) in DIFFUSE_VARIANTS.items()}
+
+# jobs depending on lights and other objects in the scene. Always baked
+SCENE_DEPENDENT_JOBS = ['Diffuse', 'Ambient Occlusion', "Diffuse Direct", "Diffuse Indirect"]
+
+# resolution divisors of the stages of a preview bake
+PREVIEW_STAGES = [8, 4, 2, 1]
+
+# noisy jobs, which can be denoised
+DENOISE_JOBS = ['Ambient Occlusion', 'Diffuse', "Diffuse Direct", "Diffuse Indirect"]
+
 PRINCIPLED_BAKER_TEMP_MATERIAL_NAME = "PRINCIPLED_BAKER_TEMP_MATERIAL_{}".format(
     time.time())
+PRINCIPLED_BAKER_TEMP_MATERIAL_VERTEX_NAME = "PRINCIPLED_BAKER_TEMP_MATERIAL_FOR_VERTEX_COLOR"
 
 
 def fill_image(image, color):
@@ -166,6 +298,607 @@ def get_invert_image(img):
     return a.reshape(size * n)
 
 
+def get_image_pixels(image):
+    """returns pixels as float32 array with shape (width * height, 4)"""
+    pixels = numpy.empty(image.size[0] * image.size[1] * 4, dtype=numpy.float32)
+    try:
+        image.pixels.foreach_get(pixels)
+    except AttributeError:  # no foreach_get before 2.83
+        pixels[:] = image.pixels[:]
+    return pixels.reshape(-1, 4)
+
+
+def set_image_pixels(image, pixels):
+    pixels = numpy.ascontiguousarray(pixels, dtype=numpy.float32).reshape(-1)
+    try:
+        image.pixels.foreach_set(pixels)
+    except AttributeError:  # no foreach_set before 2.83
+        image.pixels[:] = pixels.tolist()
+
+
+def get_channel_pixels(pixels, channel):
+    """grayscale RGBA pixels from one channel"""
+    a = numpy.empty_like(pixels)
+    a[:, 0:3] = pixels[:, channel:channel + 1]
+    a[:, 3] = 1.0
+    return a
+
+
+def srgb_to_linear(values):
+    v = numpy.asarray(values, dtype=numpy.float32)
+    return numpy.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(values):
+    v = numpy.clip(numpy.asarray(values, dtype=numpy.float32), 0, 1)
+    return numpy.where(v <= 0.0031308, v * 12.92, 1.055 * v ** (1 / 2.4) - 0.055)
+
+
+def convert_normal_pixels(pixels, source, target, renormalize=True, reconstruct_z=False):
+    """normal map pixels (n, 4) from source to target axes of R, G and B,
+    e.g. ('POS_X', 'NEG_Y', 'POS_Z'). reconstruct_z: Z from X and Y,
+    as read from two channel storage"""
+    vectors = pixels[:, 0:3] * 2 - 1
+    axes = numpy.empty_like(vectors)
+    for channel, axis in enumerate(source):
+        sign = -1.0 if axis.startswith('NEG') else 1.0
+        axes[:, 'XYZ'.index(axis[-1])] = sign * vectors[:, channel]
+    if reconstruct_z:
+        axes[:, 2] = numpy.sqrt(numpy.clip(
+            1 - axes[:, 0] * axes[:, 0] - axes[:, 1] * axes[:, 1], 0, 1))
+    if renormalize:
+        length = numpy.sqrt((axes * axes).sum(axis=1))[:, None]
+        axes = axes / numpy.maximum(length, 1e-6)
+
+    converted = pixels.copy()
+    for channel, axis in enumerate(target):
+        sign = -1.0 if axis.startswith('NEG') else 1.0
+        converted[:, channel] = sign * axes[:, 'XYZ'.index(axis[-1])] * 0.5 + 0.5
+    return converted
+
+
+def get_masked_gradient(height_map, mask, axis):
+    """central differences along axis, one-sided at UV island borders (mask False)"""
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (1, 1)
+    h = numpy.pad(height_map, pad, mode='edge')
+    m = numpy.pad(mask, pad, mode='constant')
+    if axis == 0:
+        next_h, prev_h, next_m, prev_m = h[2:], h[:-2], m[2:], m[:-2]
+    else:
+        next_h, prev_h, next_m, prev_m = h[:, 2:], h[:, :-2], m[:, 2:], m[:, :-2]
+    forward = numpy.where(next_m, next_h - height_map, 0)
+    backward = numpy.where(prev_m, height_map - prev_h, 0)
+    count = next_m.astype(numpy.float32) + prev_m
+    return (forward + backward) / numpy.maximum(count, 1)
+
+
+def get_normal_from_height(pixels, width, height, mask, strength=0.1):
+    """tangent space normal pixels (OpenGL axes) from the height in R of pixels (n, 4).
+    strength: height of 1.0 in UV space, like Distance of a Bump node"""
+    height_map = pixels[:, 0].reshape(height, width)
+    mask = mask.reshape(height, width)
+    # rows from bottom to top, X along U and Y along V
+    dx = get_masked_gradient(height_map, mask, 1) * width * strength
+    dy = get_masked_gradient(height_map, mask, 0) * height * strength
+    vectors = numpy.stack([-dx, -dy, numpy.ones_like(dx)], axis=2).reshape(-1, 3)
+    length = numpy.sqrt((vectors * vectors).sum(axis=1))[:, None]
+
+    normals = numpy.ones((width * height, 4), dtype=numpy.float32)
+    normals[:, 0:3] = vectors / length * 0.5 + 0.5
+    normals[~mask.reshape(-1), 0:3] = (0.5, 0.5, 1.0)
+    return normals
+
+
+def get_box_sum(a, radius, axis):
+    """sums over 2 * radius + 1 values along axis by cumulative sums"""
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius + 1, radius)
+    c = numpy.cumsum(numpy.pad(a, pad, mode='constant'), axis=axis)
+    n = a.shape[axis]
+    if axis == 0:
+        return c[2 * radius + 1:2 * radius + 1 + n] - c[:n]
+    return c[:, 2 * radius + 1:2 * radius + 1 + n] - c[:, :n]
+
+
+def get_masked_blur(values, mask, radius):
+    """box blur of values (height, width), which only averages pixels inside of mask"""
+    if radius < 1:
+        return values
+    weights = mask.astype(numpy.float32)
+    total = get_box_sum(get_box_sum(values * weights, radius, 0), radius, 1)
+    count = get_box_sum(get_box_sum(weights, radius, 0), radius, 1)
+    return numpy.where(count > 0, total / numpy.maximum(count, 1e-6), values)
+
+
+def get_curvature_pixels(normals, width, height, mask, cavity=False, strength=1.0, radius=1):
+    """grayscale pixels from the divergence of normal pixels (n, 4) in OpenGL axes.
+    Curvature: 0.5 is flat, convex brighter, concave darker.
+    Cavity: 1.0 is flat or convex, concave darker, blurred wider"""
+    mask = mask.reshape(height, width)
+    vectors = normals[:, 0:3] * 2 - 1
+    divergence = get_masked_gradient(vectors[:, 0].reshape(height, width), mask, 1) + \
+        get_masked_gradient(vectors[:, 1].reshape(height, width), mask, 0)
+
+    if cavity:
+        values = 1.0 + numpy.minimum(
+            get_masked_blur(divergence, mask, radius * 2 + 1), 0) * strength * 2
+        fill = 1.0
+    else:
+        values = 0.5 + get_masked_blur(divergence, mask, radius) * strength
+        fill = 0.5
+    values = numpy.where(mask, numpy.clip(values, 0, 1), fill).reshape(-1)
+
+    pixels = numpy.ones((width * height, 4), dtype=numpy.float32)
+    pixels[:, 0:3] = values[:, None]
+    return pixels
+
+
+def get_denoised_pixels(pixels, width, height, mask, guide=None, radius=3, sigma=0.1, guide_sigma=0.2):
+    """joint bilateral filter of pixels (n, 4). Neighbours are weighted by distance,
+    color difference and the difference of guide pixels (e.g. baked normals).
+    Only pixels inside of mask (UV islands) are used"""
+    rgb = pixels[:, 0:3].reshape(height, width, 3)
+    mask = mask.reshape(height, width)
+    pad = ((radius, radius), (radius, radius), (0, 0))
+    padded = numpy.pad(rgb, pad, mode='edge')
+    padded_mask = numpy.pad(mask, pad[:2], mode='constant')
+    if guide is not None:
+        guide = guide[:, 0:3].reshape(height, width, 3)
+        padded_guide = numpy.pad(guide, pad, mode='edge')
+
+    total = numpy.zeros_like(rgb)
+    weights = numpy.zeros((height, width), dtype=numpy.float32)
+    spatial_sigma = max(radius / 2, 0.5)
+    for dy in range(2 * radius + 1):
+        for dx in range(2 * radius + 1):
+            neighbours = padded[dy:dy + height, dx:dx + width]
+            w = numpy.exp(-((dx - radius) ** 2 + (dy - radius) ** 2) / (2 * spatial_sigma ** 2)) * \
+                padded_mask[dy:dy + height, dx:dx + width]
+            w = w * numpy.exp(-((neighbours - rgb) ** 2).sum(axis=2) / (2 * sigma ** 2))
+            if guide is not None:
+                g = padded_guide[dy:dy + height, dx:dx + width]
+                w = w * numpy.exp(-((g - guide) ** 2).sum(axis=2) / (2 * guide_sigma ** 2))
+            total += neighbours * w[:, :, None]
+            weights += w
+
+    denoised = pixels.copy()
+    filtered = total / numpy.maximum(weights, 1e-12)[:, :, None]
+    denoised[:, 0:3] = numpy.where(mask[:, :, None], filtered, rgb).reshape(-1, 3)
+    return denoised
+
+
+def get_diffuse_pixels(direct=None, indirect=None, color=None, srgb=False):
+    """combine diffuse components (n, 4) as Cycles does: (direct + indirect) * color.
+    Missing lighting is left out, missing color is white.
+    srgb: components and result are sRGB encoded (8 bit images), combined linear"""
+    def linear(p):
+        return srgb_to_linear(p[:, 0:3]) if srgb else p[:, 0:3]
+
+    lights = [linear(p) for p in (direct, indirect) if p is not None]
+    shape = (lights or [color])[0].shape[0]
+    pixels = numpy.ones((shape, 4), dtype=numpy.float32)
+    if lights:
+        pixels[:, 0:3] = sum(lights)
+    if color is not None:
+        pixels[:, 0:3] *= linear(color)
+    if srgb:
+        pixels[:, 0:3] = linear_to_srgb(pixels[:, 0:3])
+    return pixels
+
+
+def get_rmse(pixels, reference, mask):
+    """root mean square error of RGB inside of mask"""
+    diff = pixels[mask, 0:3] - reference[mask, 0:3]
+    return float(numpy.sqrt((diff * diff).mean())) if diff.size else 0.0
+
+
+def get_half_size(rows):
+    """2x2 box filter. rows (height, width, channels), odd last row or column is dropped"""
+    height, width = rows.shape[:2]
+    if height == 1:
+        rows = numpy.repeat(rows, 2, axis=0)
+    if width == 1:
+        rows = numpy.repeat(rows, 2, axis=1)
+    height, width = max(1, height // 2), max(1, width // 2)
+    rows = rows[:height * 2, :width * 2]
+    return rows.reshape(height, 2, width, 2, -1).mean(axis=(1, 3))
+
+
+def get_coverage(values, cutoff):
+    return (values > cutoff).mean()
+
+
+def scale_to_coverage(values, coverage, cutoff=0.5, iterations=10):
+    """scale values, so that the share of them passing the alpha cutoff is closest to coverage.
+    values are unchanged, if no scale is closer than 1.0"""
+    def get_error(scale):
+        return abs(get_coverage(values * scale, cutoff) - coverage)
+
+    best_scale, best_error = 1.0, get_error(1.0)
+    if best_error == 0:
+        return values
+
+    low, high = 0.0, 1.0
+    while get_coverage(values * high, cutoff) < coverage and high < 256:
+        high *= 2
+    for i in range(iterations):
+        scale = (low + high) / 2
+        if get_coverage(values * scale, cutoff) < coverage:
+            low = scale
+        else:
+            high = scale
+    # coverage of low is below, of high above or equal to coverage
+    for scale in [high, low]:
+        error = get_error(scale)
+        if error < best_error:
+            best_scale, best_error = scale, error
+    if best_scale == 1.0:
+        return values
+    return numpy.clip(values * best_scale, 0, 1)
+
+
+def get_mip_chain(rows, job_name, srgb=False):
+    """mipmaps down to 1x1, without rows itself. rows (height, width, 4) float.
+    sRGB colors are averaged in linear space, normals are renormalized
+    and alpha tested jobs keep their coverage"""
+    levels = []
+    level = rows.astype(numpy.float32)
+    if srgb:
+        level[:, :, 0:3] = srgb_to_linear(level[:, :, 0:3])
+
+    coverage_channels = None
+    if job_name in ALPHA_JOBS:
+        coverage_channels = [0, 1, 2]
+    elif job_name == 'Color':
+        coverage_channels = [3]
+    if coverage_channels:
+        coverage = get_coverage(level[:, :, coverage_channels], 0.5)
+
+    while level.shape[0] > 1 or level.shape[1] > 1:
+        level = get_half_size(level)
+        mip = level.copy()
+        if job_name in NORMAL_INPUTS or job_name in NORMAL_VARIANT_JOBS:
+            vectors = mip[:, :, 0:3] * 2 - 1
+            length = numpy.sqrt((vectors * vectors).sum(axis=2))[:, :, None]
+            mip[:, :, 0:3] = vectors / numpy.maximum(length, 1e-6) * 0.5 + 0.5
+        if coverage_channels:
+            mip[:, :, coverage_channels] = scale_to_coverage(
+                mip[:, :, coverage_channels], coverage)
+        if srgb:
+            mip[:, :, 0:3] = linear_to_srgb(mip[:, :, 0:3])
+        levels.append(mip)
+    return levels
+
+
+def get_uniform_color(image, tolerance=0.0, mask=None):
+    """returns color of an image with only one color (within tolerance) or None.
+    Only pixels in mask are compared (baked, inside of UV islands)"""
+    pixels = get_image_pixels(image)
+    if mask is not None and numpy.any(mask):
+        pixels = pixels[mask]
+    low = pixels.min(axis=0)
+    high = pixels.max(axis=0)
+    if numpy.all(high - low <= tolerance):
+        return ((low + high) / 2).tolist()
+    return None
+
+
+def get_pixels_digest(pixels):
+    """fast (non cryptographic) checksum of a pixel buffer"""
+    return zlib.adler32(numpy.ascontiguousarray(pixels, dtype=numpy.float32).tobytes())
+
+
+def is_pixels_equal(pixels, image):
+    other = get_image_pixels(image)
+    return pixels.shape == other.shape and numpy.array_equal(pixels, other)
+
+
+def get_properties_fingerprint(data, ignore=FINGERPRINT_IGNORE_PROPERTIES):
+    """string of all simple property values of data"""
+    values = []
+    for prop in data.bl_rna.properties:
+        if prop.identifier in ignore:
+            continue
+        if prop.type in ['BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM']:
+            value = getattr(data, prop.identifier, None)
+            if hasattr(value, '__len__') and not isinstance(value, str):
+                value = tuple(value)
+            values.append("{}={}".format(prop.identifier, value))
+    return ";".join(values)
+
+
+def get_settings_fingerprint(settings, names):
+    """string of the values of settings names"""
+    return ";".join("{}={}".format(name, getattr(settings, name)) for name in names)
+
+
+def get_job_settings(job_name):
+    """names of settings, which alter the output of job_name, but not of all jobs"""
+    names = []
+    if job_name in ['Color', 'Alpha']:
+        names += ['use_alpha_to_color', 'use_exclude_transparent_colors']
+    # derived from Bump - see create_normal_from_bump()
+    if job_name in ['Normal', 'Curvature', 'Cavity'] or \
+            NORMAL_VARIANT_JOBS.get(job_name, (None,))[0] == 'Normal':
+        names += ['use_Bump', 'use_normal_from_bump', 'normal_from_bump_strength']
+    if job_name in NORMAL_VARIANT_JOBS:
+        names += ['use_normal_renormalize', 'use_normal_reconstruct_z']
+    if job_name in ['Curvature', 'Cavity']:
+        names += ['curvature_strength', 'curvature_radius']
+    if job_name == 'Wireframe':
+        names += ['wireframe_size', 'use_pixel_size']
+    if job_name == 'Diffuse':
+        names += ['use_diffuse_components']
+    if job_name in DENOISE_JOBS:
+        names += ['use_denoise', 'denoise_radius', 'denoise_sigma']
+    return names
+
+
+def get_image_fingerprint(image):
+    if not image:
+        return "None"
+    values = [image.name, image.source, image.filepath,
+              image.colorspace_settings.name]
+    if image.packed_file:
+        values.append(str(image.packed_file.size))
+    else:
+        abs_path = bpy.path.abspath(image.filepath)
+        if os.path.isfile(abs_path):
+            stat = os.stat(abs_path)
+            values.extend([str(stat.st_size), str(stat.st_mtime)])
+    if image.source == 'GENERATED':
+        values.append(get_properties_fingerprint(image, []))
+    return ";".join(values)
+
+
+def get_node_tree_fingerprint(node_tree, cache=None):
+    """sha1 of all nodes, values, images and links of a node tree. Node groups included.
+    cache is keyed by pointer, all material node trees have the same name"""
+    if cache is None:
+        cache = {}
+    key = node_tree.as_pointer()
+    if key in cache:
+        return cache[key]
+
+    h = hashlib.sha1()
+    for node in sorted(node_tree.nodes, key=lambda n: n.name):
+        h.update(node.name.encode('utf-8'))
+        h.update(node.bl_idname.encode('utf-8'))
+        h.update(get_properties_fingerprint(node).encode('utf-8'))
+        for socket in node.inputs:
+            if not socket.is_linked and hasattr(socket, 'default_value'):
+                value = socket.default_value
+                if hasattr(value, '__len__'):
+                    value = tuple(value)
+                h.update("{}={}".format(socket.identifier, value).encode('utf-8'))
+        if hasattr(node, 'image'):
+            h.update(get_image_fingerprint(node.image).encode('utf-8'))
+        if node.type == 'VALTORGB':
+            for elem in node.color_ramp.elements:
+                h.update("{}{}".format(elem.position, tuple(elem.color)).encode('utf-8'))
+        if node.type in ['CURVE_RGB', 'CURVE_VEC']:
+            for curve in node.mapping.curves:
+                for point in curve.points:
+                    h.update("{}{}".format(tuple(point.location), point.handle_type).encode('utf-8'))
+        if node.type == 'GROUP' and node.node_tree:
+            h.update(get_node_tree_fingerprint(node.node_tree, cache).encode('utf-8'))
+
+    links = ["{}:{}>{}:{}".format(l.from_node.name, l.from_socket.identifier,
+                                  l.to_node.name, l.to_socket.identifier) for l in node_tree.links]
+    for link in sorted(links):
+        h.update(link.encode('utf-8'))
+
+    cache[key] = h.hexdigest()
+    return cache[key]
+
+
+def get_used_material_indices(mesh):
+    """material slot indices assigned to at least one polygon"""
+    indices = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+    mesh.polygons.foreach_get('material_index', indices)
+    return set(numpy.unique(indices).tolist())
+
+
+def get_mesh_fingerprint(obj):
+    """sha1 of geometry, UV maps, vertex colors, material indices, transform and modifiers"""
+    mesh = obj.data
+    h = hashlib.sha1()
+
+    def update(collection, attr, size, dtype=numpy.float32):
+        a = numpy.empty(len(collection) * size, dtype=dtype)
+        collection.foreach_get(attr, a)
+        h.update(a.tobytes())
+
+    update(mesh.vertices, 'co', 3)
+    update(mesh.loops, 'vertex_index', 1, numpy.int32)
+    update(mesh.polygons, 'material_index', 1, numpy.int32)
+    update(mesh.polygons, 'use_smooth', 1, numpy.bool_)
+    for uv_layer in mesh.uv_layers:
+        # packed from the other UV maps - see pack_atlas_uvs()
+        if uv_layer.name == ATLAS_UV_NAME:
+            continue
+        h.update(uv_layer.name.encode('utf-8'))
+        update(uv_layer.data, 'uv', 2)
+    for vert_col in mesh.vertex_colors:
+        h.update(vert_col.name.encode('utf-8'))
+        # 2.79 RGB, 2.80 RGBA
+        update(vert_col.data, 'color', 3 if is_2_79 else 4)
+
+    h.update(str([tuple(row) for row in obj.matrix_world]).encode('utf-8'))
+    h.update(str(mesh.use_auto_smooth).encode('utf-8'))
+    for mod in obj.modifiers:
+        h.update(get_properties_fingerprint(mod).encode('utf-8'))
+    return h.hexdigest()
+
+
+class DirectoryIndex():
+    """Names, sizes and mtimes of all files in a directory.
+    Scanned once with os.scandir and updated, when files are written or removed"""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.scan()
+
+    def scan(self):
+        self.files.clear()
+        try:
+            for entry in os.scandir(self.path):
+                if entry.is_file():
+                    stat = entry.stat()
+                    self.files[os.path.normcase(entry.name)] = (
+                        stat.st_size, stat.st_mtime)
+        except OSError as e:
+            print("Error: {} {} ".format(self.path, e))
+
+    def is_file(self, file_name):
+        return os.path.normcase(file_name) in self.files
+
+    def get_stat(self, file_name):
+        """returns (size, mtime) or None"""
+        return self.files.get(os.path.normcase(file_name))
+
+    def update(self, file_name):
+        """call after file_name was written"""
+        try:
+            stat = os.stat(os.path.join(self.path, file_name))
+            self.files[os.path.normcase(file_name)] = (
+                stat.st_size, stat.st_mtime)
+        except OSError:
+            self.remove(file_name)
+
+    def remove(self, file_name):
+        self.files.pop(os.path.normcase(file_name), None)
+
+
+def read_json(file_path):
+    if not os.path.isfile(file_path):
+        return {}
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print("Error: {} {} ".format(file_path, e))
+        return {}
+
+
+def write_json(file_path, data):
+    try:
+        with open(file_path, 'w') as f:
+            json.dump(data, f, indent=4, sort_keys=True)
+    except OSError as e:
+        print("Error: {} {} ".format(file_path, e))
+
+
+def read_manifest(dir_path):
+    return read_json(os.path.join(dir_path, MANIFEST_FILE_NAME))
+
+
+def write_manifest(dir_path, manifest):
+    file_path = os.path.join(dir_path, MANIFEST_FILE_NAME)
+    # no empty manifest
+    if not any(manifest.values()) and not os.path.isfile(file_path):
+        return
+    write_json(file_path, manifest)
+
+
+def get_user_config_path(file_name):
+    """for data stored per machine in the user config directory"""
+    return os.path.join(bpy.utils.user_resource('CONFIG', create=True),
+                        file_name)
+
+
+def get_triangle_count(objects):
+    count = 0
+    for obj in objects:
+        totals = numpy.empty(len(obj.data.polygons), dtype=numpy.int64)
+        obj.data.polygons.foreach_get('loop_total', totals)
+        count += int(totals.sum()) - 2 * len(totals)
+    return count
+
+
+class TimingModel():
+    """Bake and save durations per (job, resolution, samples) and triangle count.
+    Predicts the duration of a job by a linear fit over the triangle count"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.records = read_json(file_path)
+
+    def get_key(self, job_name, resolution, samples):
+        return "{}|{}|{}".format(job_name, resolution, samples)
+
+    def record(self, job_name, resolution, samples, triangles, bake_time, save_time):
+        records = self.records.setdefault(
+            self.get_key(job_name, resolution, samples), [])
+        records.append([triangles, bake_time, save_time])
+        del records[:-MAX_TIMING_RECORDS]
+
+    def predict(self, job_name, resolution, samples, triangles):
+        """returns predicted seconds for bake and save or None"""
+        records = self.records.get(self.get_key(job_name, resolution, samples))
+        if not records:
+            return None
+        a = numpy.array(records, dtype=numpy.float64)
+        durations = a[:, 1] + a[:, 2]
+        if len(set(a[:, 0])) < 2:
+            return float(durations.mean())
+        slope, intercept = numpy.polyfit(a[:, 0], durations, 1)
+        return max(0.0, float(slope * triangles + intercept))
+
+    def save(self):
+        write_json(self.file_path, self.records)
+
+
+def get_bake_device():
+    return 'GPU' if bpy.context.scene.cycles.device == 'GPU' else 'CPU'
+
+
+def get_default_tile_size(device, resolution):
+    """small tiles keep all CPU threads busy, GPUs need large tiles"""
+    if device == 'GPU':
+        tile_size = 512 if resolution >= 2048 else 256
+    else:
+        tile_size = 64 if resolution >= 4096 else 32
+    return min(tile_size, resolution)
+
+
+def get_default_threads(resolution, tile_size):
+    """all CPU threads, but not more threads than tiles"""
+    tiles = ((resolution + tile_size - 1) // tile_size) ** 2
+    return max(1, min(os.cpu_count() or 1, tiles))
+
+
+def get_thread_candidates(device, resolution, tile_size):
+    threads = get_default_threads(resolution, tile_size)
+    return sorted(set(max(1, int(threads * share)) for share in THREAD_SHARES[device]),
+                  reverse=True)
+
+
+class BakePerformanceProfile():
+    """Temporary threads and tile size for bake calls. restore() sets the original settings"""
+
+    def __init__(self, scene):
+        render = scene.render
+        self.render = render
+        self.orig_settings = (render.threads_mode, render.threads,
+                              render.tile_x, render.tile_y)
+
+    def set(self, tile_size, threads):
+        self.render.threads_mode = 'FIXED'
+        self.render.threads = threads
+        self.render.tile_x = tile_size
+        self.render.tile_y = tile_size
+
+    def restore(self):
+        threads_mode, threads, tile_x, tile_y = self.orig_settings
+        self.render.threads_mode = threads_mode
+        self.render.threads = threads
+        self.render.tile_x = tile_x
+        self.render.tile_y = tile_y
+
+
 def get_sibling_node(node):
     if node.outputs[0].is_linked:
         parent_node = node.outputs[0].links[0].to_node
@@ -195,6 +928,224 @@ def are_node_types_in_node_tree(node, node_types):
     return False
 
 
+def get_uv_coordinates(uv_layer):
+    uvs = numpy.empty(len(uv_layer.data) * 2, dtype=numpy.float32)
+    uv_layer.data.foreach_get('uv', uvs)
+    return uvs.reshape(-1, 2)
+
+
+def get_loop_faces(mesh):
+    """face of each loop, loop start, loop total and area of each face"""
+    face_count = len(mesh.polygons)
+    starts = numpy.empty(face_count, dtype=numpy.int64)
+    mesh.polygons.foreach_get('loop_start', starts)
+    totals = numpy.empty(face_count, dtype=numpy.int64)
+    mesh.polygons.foreach_get('loop_total', totals)
+    areas = numpy.empty(face_count, dtype=numpy.float32)
+    mesh.polygons.foreach_get('area', areas)
+    order = numpy.argsort(starts)
+    return numpy.repeat(order, totals[order]), starts, totals, areas
+
+
+def get_uv_triangles(objects):
+    """UV coordinates (n, 3, 2) of the faces of the active UV maps of objects,
+    split into triangle fans. None, if no object has a UV map"""
+    triangles = []
+    for obj in objects:
+        uv_layer = obj.data.uv_layers.active
+        if not uv_layer:
+            continue
+        uvs = get_uv_coordinates(uv_layer)
+        faces, starts, totals, areas = get_loop_faces(obj.data)
+        fans = numpy.maximum(totals - 2, 0)
+        first = numpy.repeat(starts, fans)
+        offsets = numpy.arange(fans.sum()) - numpy.repeat(numpy.cumsum(fans) - fans, fans) + 1
+        triangles.append(numpy.stack(
+            [uvs[first], uvs[first + offsets], uvs[first + offsets + 1]], axis=1))
+    if not triangles:
+        return None
+    return numpy.concatenate(triangles)
+
+
+def get_uv_coverage(triangles, width, height):
+    """True for pixels with their center inside of one of the UV triangles (n, 3, 2),
+    bottom row first as in Blender. All True, if triangles is None"""
+    if triangles is None:
+        return numpy.ones(width * height, dtype=bool)
+    mask = numpy.zeros((height, width), dtype=bool)
+
+    # pixel centers at integer coordinates
+    p = triangles.astype(numpy.float64) * (width, height) - 0.5
+    a, b, c = p[:, 0], p[:, 1], p[:, 2]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    low = numpy.maximum(numpy.ceil(p.min(axis=1) - 1e-6), 0).astype(numpy.int64)
+    high = numpy.minimum(numpy.floor(p.max(axis=1) + 1e-6),
+                         (width - 1, height - 1)).astype(numpy.int64)
+    size = high - low + 1
+    valid = numpy.all(size > 0, axis=1) & (numpy.abs(area) > 1e-12)
+    p, low, size, area = p[valid], low[valid], size[valid], area[valid]
+    if not len(p):
+        return mask.reshape(-1)
+
+    # triangles with bounding boxes of similar size are tested together
+    buckets = numpy.left_shift(1, numpy.ceil(numpy.log2(size)).astype(numpy.int64))
+    keys = buckets[:, 0] * (2 * max(width, height)) + buckets[:, 1]
+    for key in numpy.unique(keys):
+        indices = numpy.nonzero(keys == key)[0]
+        bw, bh = buckets[indices[0]]
+        # large bounding boxes in blocks
+        block_w, block_h = min(bw, 2048), min(bh, 2048)
+        chunk = max(1, COVERAGE_CHUNK_PIXELS // (block_w * block_h))
+        for start in range(0, len(indices), chunk):
+            i = indices[start:start + chunk]
+            sign = numpy.sign(area[i])[:, None, None]
+            for oy in range(0, bh, block_h):
+                for ox in range(0, bw, block_w):
+                    x = low[i, 0, None, None] + ox + numpy.arange(block_w)[None, None, :]
+                    y = low[i, 1, None, None] + oy + numpy.arange(block_h)[None, :, None]
+                    x, y = numpy.broadcast_arrays(x, y)
+                    inside = (x < width) & (y < height)
+                    for j in range(3):
+                        e0 = p[i, j]
+                        e1 = p[i, (j + 1) % 3]
+                        edge = (e1[:, 0, None, None] - e0[:, 0, None, None]) * (y - e0[:, 1, None, None]) - \
+                            (e1[:, 1, None, None] - e0[:, 1, None, None]) * (x - e0[:, 0, None, None])
+                        inside &= edge * sign >= -1e-9
+                    mask[y[inside], x[inside]] = True
+    return mask.reshape(-1)
+
+
+def get_uv_islands(mesh, uvs):
+    """island of each loop and (surface area, UV area) of each island.
+    Faces are connected by loops with the same vertex and UV coordinates"""
+    loop_count = len(mesh.loops)
+    face_count = len(mesh.polygons)
+    vertices = numpy.empty(loop_count, dtype=numpy.int64)
+    mesh.loops.foreach_get('vertex_index', vertices)
+    faces, starts, totals, areas = get_loop_faces(mesh)
+
+    # loops with same vertex and UV
+    q = numpy.round(uvs * 65536).astype(numpy.int64)
+    sort = numpy.lexsort((q[:, 1], q[:, 0], vertices))
+    new_group = numpy.ones(loop_count, dtype=bool)
+    new_group[1:] = (numpy.diff(vertices[sort]) != 0) | (numpy.diff(q[sort, 0]) != 0) | \
+        (numpy.diff(q[sort, 1]) != 0)
+    groups = numpy.empty(loop_count, dtype=numpy.int64)
+    groups[sort] = numpy.cumsum(new_group) - 1
+    group_count = groups.max() + 1 if loop_count else 0
+
+    # connected faces get the lowest face index
+    labels = numpy.arange(face_count)
+    while True:
+        group_labels = numpy.full(group_count, face_count, dtype=numpy.int64)
+        numpy.minimum.at(group_labels, groups, labels[faces])
+        new_labels = labels.copy()
+        numpy.minimum.at(new_labels, faces, group_labels[groups])
+        new_labels = new_labels[new_labels]
+        if numpy.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    face_islands = numpy.unique(labels, return_inverse=True)[1]
+
+    # UV area of each face (shoelace)
+    next_loops = numpy.arange(1, loop_count + 1)
+    last_loops = starts + totals - 1
+    next_loops[last_loops] = starts
+    u, v = uvs[:, 0], uvs[:, 1]
+    cross = u * v[next_loops] - u[next_loops] * v
+    uv_areas = numpy.abs(numpy.bincount(faces, cross, face_count)) / 2
+
+    island_count = face_islands.max() + 1 if face_count else 0
+    return (face_islands[faces],
+            numpy.bincount(face_islands, areas, island_count),
+            numpy.bincount(face_islands, uv_areas, island_count))
+
+
+def get_uv_island_rects(mesh, uvs, area_scale=1.0):
+    """island of each loop, lower left UV, scale and scaled size of each island.
+    Islands are scaled to the same texel density"""
+    loop_islands, surface_areas, uv_areas = get_uv_islands(mesh, uvs)
+    island_count = len(uv_areas)
+    scales = numpy.sqrt(surface_areas * area_scale / numpy.maximum(uv_areas, 1e-12))
+    scales[uv_areas < 1e-12] = 0.0
+
+    low = numpy.full((island_count, 2), numpy.inf, dtype=numpy.float32)
+    high = numpy.full((island_count, 2), -numpy.inf, dtype=numpy.float32)
+    numpy.minimum.at(low, loop_islands, uvs)
+    numpy.maximum.at(high, loop_islands, uvs)
+    return loop_islands, low, scales, (high - low) * scales[:, None]
+
+
+def get_atlas_uvs(uvs, loop_islands, low, island_scales, offsets, scale):
+    """UVs moved to the packed islands. returns flat float32 array for foreach_set"""
+    atlas_uvs = (uvs - low[loop_islands]) * (island_scales[loop_islands] * scale)[:, None] + \
+        offsets[loop_islands]
+    return atlas_uvs.astype(numpy.float32).reshape(-1)
+
+
+def get_udim_tiles(mesh, uvs, area_scale=1.0):
+    """surface area of each UDIM tile touched by the faces. returns {tile: area}.
+    Faces belong to the tile of their UV center"""
+    faces, starts, totals, areas = get_loop_faces(mesh)
+    if not len(areas):
+        return {}
+    center_u = numpy.bincount(faces, uvs[:, 0], len(areas)) / numpy.maximum(totals, 1)
+    center_v = numpy.bincount(faces, uvs[:, 1], len(areas)) / numpy.maximum(totals, 1)
+    tile_u = numpy.clip(numpy.floor(center_u), 0, 9).astype(numpy.int64)
+    tile_v = numpy.clip(numpy.floor(center_v), 0, 99).astype(numpy.int64)
+    tiles = UDIM_FIRST_TILE + tile_u + 10 * tile_v
+    tile_areas = numpy.bincount(tiles - UDIM_FIRST_TILE, areas * area_scale)
+    return dict((int(i) + UDIM_FIRST_TILE, float(tile_areas[i]))
+                for i in numpy.nonzero(tile_areas)[0])
+
+
+def get_udim_resolutions(tile_areas, resolution, use_density=False, min_resolution=64):
+    """resolution of each tile. use_density: scaled by the surface area of the tile,
+    power of 2 fractions of resolution for the tile with the largest area"""
+    if not use_density or not tile_areas:
+        return dict((tile, resolution) for tile in tile_areas)
+    max_area = max(tile_areas.values())
+    resolutions = {}
+    for tile, area in tile_areas.items():
+        res = resolution
+        while res / 2 >= max(min_resolution, resolution * (area / max_area) ** 0.5):
+            res //= 2
+        resolutions[tile] = res
+    return resolutions
+
+
+def get_udim_file_path(file_path, tile):
+    """<name>.<tile>.<ext>"""
+    root, ext = os.path.splitext(file_path)
+    return "{0}.{1}{2}".format(root, tile, ext)
+
+
+def pack_rectangles(sizes, margin=0.0):
+    """shelf packing, tallest rectangles first, into the unit square.
+    sizes (n, 2). returns offsets (n, 2) and the scale of the sizes.
+    margin is the gap between rectangles after scaling"""
+    sizes = numpy.asarray(sizes, dtype=numpy.float64)
+    order = numpy.argsort(-sizes[:, 1], kind='mergesort')
+    offsets = numpy.zeros_like(sizes)
+    scale = 1.0
+    # the scale depends on the margin, which depends on the scale
+    for i in range(3):
+        gap = margin / scale
+        padded = sizes + gap
+        width = max(numpy.sqrt((padded[:, 0] * padded[:, 1]).sum()), padded[:, 0].max())
+        x = y = shelf_height = 0.0
+        for index in order:
+            w, h = padded[index]
+            if x + w > width and x > 0:
+                y += shelf_height
+                x = shelf_height = 0.0
+            offsets[index] = (x + gap / 2, y + gap / 2)
+            x += w
+            shelf_height = max(shelf_height, h)
+        scale = 1.0 / max(width, y + shelf_height)
+    return offsets * scale, scale
+
+
 def select_set(obj, s):
     # 2.79
     if is_2_79:
@@ -204,6 +1155,104 @@ def select_set(obj, s):
         obj.select_set(s)
 
 
+class SelectionState():
+    """Snapshot of selected objects. Only objects with a changed state are (de)selected.
+    updates counts all select_set calls for benchmarking"""
+
+    def __init__(self, selected_objects):
+        self.orig_selected = set(selected_objects)
+        self.selected = set(selected_objects)
+        self.updates = 0
+
+    def set(self, objects):
+        """select objects, deselect all others"""
+        objects = set(objects)
+        for obj in self.selected - objects:
+            select_set(obj, False)
+            self.updates += 1
+        for obj in objects - self.selected:
+            select_set(obj, True)
+            self.updates += 1
+        self.selected = objects
+
+    def restore(self):
+        self.set(self.orig_selected)
+
+
+class RenderIsolation():
+    """Snapshot of render visibility. Hides all other objects from rendering,
+    so Cycles only syncs (and builds the BVH for) the objects to bake"""
+
+    def __init__(self, objects):
+        self.orig_hide_render = {obj: obj.hide_render for obj in objects}
+        self.hidden = set()
+
+    def set(self, objects):
+        """hide all objects but objects from rendering"""
+        objects = set(objects)
+        to_hide = set(obj for obj, hide in self.orig_hide_render.items()
+                      if not hide and obj not in objects)
+        for obj in to_hide - self.hidden:
+            obj.hide_render = True
+        for obj in self.hidden - to_hide:
+            obj.hide_render = False
+        self.hidden = to_hide
+
+    def restore(self):
+        self.set(self.orig_hide_render.keys())
+
+
+class SettingsOverride():
+    """settings with some values replaced, e.g. for the stages of a preview bake"""
+
+    def __init__(self, settings, **values):
+        self.settings = settings
+        self.values = values
+
+    def __getattr__(self, name):
+        if name in self.values:
+            return self.values[name]
+        return getattr(self.settings, name)
+
+
+class PostProcessGraph():
+    """Derived outputs (glossiness, alpha to color, ...) as a small dependency graph.
+    Each node runs once, after all jobs are baked"""
+
+    def __init__(self):
+        self.nodes = []
+
+    def add(self, name, inputs, function, optional_inputs=()):
+        """function is called with the images of inputs and optional_inputs (None, if
+        not baked) and returns the derived image. Only inputs trigger the node"""
+        self.nodes.append((name, inputs, function, list(optional_inputs)))
+
+    def run(self, images, changed):
+        """run nodes with all inputs in images and at least one input in changed.
+        returns dictionary of derived images"""
+        images = dict(images)
+        changed = set(changed)
+        derived = {}
+        pending = list(self.nodes)
+        while pending:
+            # wait for nodes, which derive one of the inputs
+            outputs = set(node[0] for node in pending)
+            ready = [node for node in pending
+                     if not any(i in outputs and i != node[0] for i in node[1] + node[3])]
+            if not ready:
+                break  # cycle
+            name, inputs, function, optional_inputs = ready[0]
+            pending.remove(ready[0])
+            if all(i in images for i in inputs) and changed.intersection(inputs):
+                image = function(*[images[i] for i in inputs] +
+                                 [images.get(i) for i in optional_inputs])
+                if image:
+                    images[name] = image
+                    derived[name] = image
+                    changed.add(name)
+        return derived
+
+
 def save_image_as(image, file_path, file_format, color_mode='RGB', color_depth='8', compression=15, quality=90, tiff_codec='DEFLATE', exr_codec='ZIP'):
     s = bpy.context.scene.render.image_settings
     fm = s.file_format
@@ -241,6 +1290,32 @@ def save_image_as(image, file_path, file_format, color_mode='RGB', color_depth='
     bpy.context.scene.view_settings.view_transform = vt
 
 
+def get_dds_format(job_name, color_mode='RGB'):
+    """BC5 for normal maps, BC4 for grayscale maps, BC1 or BC3 (with alpha) for colors"""
+    if job_name in NORMAL_MAP_JOBS or job_name in NORMAL_VARIANT_JOBS:
+        return 'BC5'
+    if job_name in GRAYSCALE_JOBS:
+        return 'BC4'
+    return 'BC3' if color_mode == 'RGBA' else 'BC1'
+
+
+def save_image_as_dds(image, file_path, dds_format, quality=False, mip_job_name=None):
+    """mipmaps are embedded, if mip_job_name is given"""
+    width, height = image.size
+    pixels = get_image_pixels(image)
+    srgb = image.colorspace_settings.name == 'sRGB'
+    # 8 bit formats store sRGB colors, float images are linear
+    if image.is_float and srgb:
+        pixels[:, 0:3] = linear_to_srgb(pixels[:, 0:3])
+    # DDS starts with the top row
+    rows = pixels.reshape(height, width, 4)[::-1]
+    levels = [rows]
+    if mip_job_name:
+        levels.extend(get_mip_chain(rows, mip_job_name, srgb))
+    data = [encode_dds_image(level, dds_format, quality) for level in levels]
+    write_dds(bpy.path.abspath(file_path), width, height, dds_format, data)
+
+
 def prepare_bake_factor(mat, socket, new_socket, node_type, factor_name='Fac'):
     node = socket.node
     if node.type == node_type:
@@ -498,15 +1573,41 @@ def prepare_bake(mat, socket, new_socket, input_socket_name):
                                  input_socket_name)
 
 
-def add_temp_material(obj):
-    name = "PRINCIPLED_BAKER_TEMP_MATERIAL_FOR_VERTEX_COLOR_{}".format(
-        time.time())
+def get_temp_material():
+    """returns temp material for vertex color. Created once and reused for all objects and jobs"""
+    name = PRINCIPLED_BAKER_TEMP_MATERIAL_VERTEX_NAME
+    mat = bpy.data.materials.get(name)
+    if mat and MATERIAL_TAG_VERTEX in mat.keys():
+        return mat
     mat = bpy.data.materials.new(name)
     mat[MATERIAL_TAG_VERTEX] = 1
     mat.use_nodes = True
     principled_node = find_node_by_type(mat, 'BSDF_PRINCIPLED')
     principled_node.inputs["Base Color"].default_value = [0, 0, 0, 1]
-    obj.data.materials.append(mat)
+    return mat
+
+
+def add_temp_material(obj):
+    obj.data.materials.append(get_temp_material())
+
+
+def remove_tagged_materials(obj, tag):
+    """remove all tagged materials from mesh data at once, no operator calls"""
+    materials = obj.data.materials
+    indices = [i for i, mat in enumerate(materials) if mat and tag in mat.keys()]
+    for index in reversed(indices):
+        # 2.79
+        if is_2_79:
+            materials.pop(index=index, update_data=True)
+        # 2.80
+        else:
+            materials.pop(index=index)
+
+
+def remove_temp_materials():
+    for mat in bpy.data.materials:
+        if MATERIAL_TAG_VERTEX in mat.keys() and mat.users == 0:
+            bpy.data.materials.remove(mat)
 
 
 def is_socket_linked_in_node_tree(node, input_socket_name):
@@ -546,7 +1647,7 @@ def has_material(obj):
 def get_bake_type(job_name):
     if job_name in NORMAL_INPUTS:
         return 'NORMAL'
-    if job_name in ['Diffuse']:
+    if job_name in ['Diffuse'] or job_name in DIFFUSE_COMPONENT_JOBS:
         return 'DIFFUSE'
     else:
         return 'EMIT'
@@ -597,30 +1698,69 @@ def set_material_outputs_target_to_all(objects):
                         node.target = 'ALL'
 
 
-def get_value_list(node, value_name):
-    value_list = []
+def get_socket_value(socket):
+    """returns default value of socket as tuple of floats"""
+    value = socket.default_value
+    try:
+        return tuple(value)
+    except TypeError:
+        return (value,)
 
-    def find_values(node, value_name):
-        if not node.type in ['NORMAL_MAP', 'AMBIENT_OCCLUSION']:
-            if value_name == 'Color' and node.type == 'BSDF_PRINCIPLED':
-                tmp_value_name = 'Base Color'
-            else:
-                tmp_value_name = value_name
-            if tmp_value_name in node.inputs.keys():
-                if node.inputs[tmp_value_name].type == 'RGBA':
-                    [r, g, b, a] = node.inputs[tmp_value_name].default_value
-                    value_list.append([r, g, b, a])
-                else:
-                    value_list.append(
-                        node.inputs[value_name].default_value)
 
-            for socket in node.inputs:
-                if socket.is_linked:
-                    from_node = socket.links[0].from_node
-                    find_values(from_node, value_name)
+def get_value_table(node, exclude_node_types=['NORMAL_MAP', 'AMBIENT_OCCLUSION']):
+    """returns {value_name: [values]} of VALUE_INPUTS in node and all upstream nodes.
+    One traversal for all value names, every node is visited once"""
+    value_table = {}
+    visited = set()
+
+    def find_values(node):
+        if node.name in visited:
+            return
+        visited.add(node.name)
+        if node.type in exclude_node_types:
+            return
+
+        found = set()
+        for socket in node.inputs:
+            value_name = socket.name
+            if value_name == 'Base Color' and node.type == 'BSDF_PRINCIPLED':
+                value_name = 'Color'
+            if value_name in found or value_name not in VALUE_INPUTS:
+                continue
+            if hasattr(socket, 'default_value'):
+                found.add(value_name)
+                value_table.setdefault(value_name, []).append(
+                    get_socket_value(socket))
+
+        for socket in node.inputs:
+            if socket.is_linked:
+                find_values(socket.links[0].from_node)
+
+    find_values(node)
+    return value_table
+
 
-    find_values(node, value_name)
-    return value_list
+def merge_value_tables(value_tables):
+    merged = {}
+    for value_table in value_tables:
+        for value_name, values in value_table.items():
+            merged.setdefault(value_name, []).extend(values)
+    return merged
+
+
+def is_value_list_equal(values):
+    """vectorized is_list_equal for lists of value tuples"""
+    if any(len(v) != len(values[0]) for v in values):
+        return False
+    a = numpy.array(values)
+    return bool((a == a[0]).all())
+
+
+def get_default_value(value):
+    """value tuple to float or list, to be used as default_value"""
+    if len(value) == 1:
+        return value[0]
+    return list(value)
 
 
 def prepare_material_for_bake(material):
@@ -683,26 +1823,23 @@ def get_joblist_from_object(obj):
             prepare_material_for_bake(mat)
 
     # add to joblist if values differ
-    for value_name in NODE_INPUTS:
-        if value_name not in joblist:
-            if value_name not in ['Subsurface Radius', 'Normal', 'Clearcoat Normal', 'Tangent']:
-                value_list = []
-                for mat_slot in obj.material_slots:
-                    if mat_slot.material:
-                        mat = mat_slot.material
-                        if not MATERIAL_TAG in mat.keys():
-                            # material_output = get_active_output(mat)
-                            material_output = None
-                            for node in mat.node_tree.nodes:
-                                if node.type == "OUTPUT_MATERIAL" and NODE_TAG in node.keys():
-                                    material_output = node
-                            if material_output:
-                                value_list.extend(get_value_list(
-                                    material_output, value_name))
-                # if len(value_list) >= 1:
-                if value_list:
-                    if not is_list_equal(value_list):
-                        joblist.append(value_name)
+    value_tables = []
+    for mat_slot in obj.material_slots:
+        if mat_slot.material:
+            mat = mat_slot.material
+            if not MATERIAL_TAG in mat.keys():
+                # material_output = get_active_output(mat)
+                material_output = None
+                for node in mat.node_tree.nodes:
+                    if node.type == "OUTPUT_MATERIAL" and NODE_TAG in node.keys():
+                        material_output = node
+                if material_output:
+                    value_tables.append(get_value_table(material_output))
+    value_table = merge_value_tables(value_tables)
+    for value_name in VALUE_INPUTS:
+        values = value_table.get(value_name)
+        if values and not is_value_list_equal(values):
+            joblist.append(value_name)
 
     # search material for jobs
     for mat_slot in obj.material_slots:
@@ -803,7 +1940,15 @@ def get_joblist_manual():
     return joblist
 
 
+# directories with write permission, checked once per session
+WRITABLE_DIRS = set()
+
+
 def check_permission(path):
+    if path in WRITABLE_DIRS:
+        return True
+    checked_path = path
+
     if not path.endswith("\\"):
         path += "\\"
 
@@ -822,6 +1967,7 @@ def check_permission(path):
         print("Error: {} {} ".format(e.filename, e.strerror))
         return False
 
+    WRITABLE_DIRS.add(checked_path)
     return True
 
 
@@ -943,117 +2089,196 @@ def duplicate_nodes(mat, nodes, keep_inputs=False):
     return list(new_nodes.values())
 
 
-def ungroup_nodes(mat, group_nodes):
+class GroupTemplate():
+    """Flattened node group, nested groups included.
+    specs: nodes of the group to duplicate or ('VALUE'/'RGBA', value) for value nodes.
+    refs to output sockets are (spec index, socket index) or ('INPUT', group input index)"""
 
-    new_nodes = {}
-    val_nodes = []
+    def __init__(self):
+        self.specs = []
+        self.links = []  # (from ref, (spec index, input index))
+        self.output_sources = {}  # group output index: from ref
+        self.upstream = {}  # spec index: from refs
 
-    def duplicate_from_input_socket(mat, input_socket, link_to_socket):
-        if not input_socket:
-            return
-        old_node = input_socket.links[0].from_node
-        old_from_socket = input_socket.links[0].from_socket
-        if old_node.type == 'GROUP_INPUT':
-
-            # link
-            index_in = socket_index(old_from_socket)
-            if group_node.inputs[index_in].is_linked:
-                from_socket = group_node.inputs[index_in].links[0].from_socket
-                to_socket = link_to_socket
-                mat.node_tree.links.new(from_socket, to_socket)
-            return
+    def add_link(self, from_ref, to_ref):
+        self.links.append((from_ref, to_ref))
+        self.upstream.setdefault(to_ref[0], []).append(from_ref)
 
-        # create new node or take existing
-        index_out = socket_index(old_from_socket)
-        if old_node in new_nodes.keys():
-            new_node = new_nodes[old_node]
-            # link
-            from_socket = new_node.outputs[index_out]
-            to_socket = link_to_socket
-            mat.node_tree.links.new(from_socket, to_socket)
-            return
+
+# flattened groups and fingerprints of group trees of the current bake - see clear_group_templates()
+GROUP_TEMPLATES = {}
+GROUP_FINGERPRINTS = {}
+
+
+def get_group_template(node_tree):
+    """returns flattened template of node_tree. Cached by content, so edits between bakes
+    invalidate it. Each group tree is fingerprinted once per bake"""
+    key = (node_tree.as_pointer(), get_node_tree_fingerprint(node_tree, GROUP_FINGERPRINTS))
+    if key not in GROUP_TEMPLATES:
+        GROUP_TEMPLATES[key] = flatten_group(node_tree)
+    return GROUP_TEMPLATES[key]
+
+
+def clear_group_templates():
+    GROUP_TEMPLATES.clear()
+    GROUP_FINGERPRINTS.clear()
+
+
+def flatten_group(node_tree):
+    template = GroupTemplate()
+    node_specs = {}  # node name: spec index
+    sub_groups = {}  # group node name: (template, spec offset)
+
+    for node in node_tree.nodes:
+        if node.type in ['GROUP_INPUT', 'GROUP_OUTPUT', 'FRAME']:
+            continue
+        if node.type == 'GROUP' and node.node_tree:
+            sub_template = get_group_template(node.node_tree)
+            sub_groups[node.name] = (sub_template, len(template.specs))
+            template.specs.extend(sub_template.specs)
         else:
-            new_node = duplicate_node(mat, old_node)
-            new_nodes[old_node] = new_node
-            # link
-            from_socket = new_node.outputs[index_out]
-            to_socket = link_to_socket
-            mat.node_tree.links.new(from_socket, to_socket)
-
-            for input_socket in old_node.inputs:
-                if input_socket.is_linked:
-                    index_in = socket_index(input_socket)
-                    link_to_socket = new_node.inputs[index_in]
-                    duplicate_from_input_socket(
-                        mat, input_socket, link_to_socket)
+            node_specs[node.name] = len(template.specs)
+            template.specs.append(node)
+
+    input_sources = {}
+
+    def get_input_source(group_node, index):
+        """from ref for input of a nested group node"""
+        key = (group_node.name, index)
+        if key in input_sources:
+            return input_sources[key]
+        input = group_node.inputs[index]
+        source = None
+        if input.is_linked:
+            link = input.links[0]
+            source = get_source(link.from_node, socket_index(link.from_socket))
+        elif input.type in ['VALUE', 'RGBA']:
+            val = input.default_value
+            if input.type == 'RGBA':
+                val = tuple(val)
+            template.specs.append((input.type, val))
+            source = (len(template.specs) - 1, 0)
+        input_sources[key] = source
+        return source
+
+    def shift(ref, group_node, offset):
+        """from ref of a nested template to from ref of this template"""
+        if ref[0] == 'INPUT':
+            return get_input_source(group_node, ref[1])
+        return (ref[0] + offset, ref[1])
+
+    def get_source(node, index):
+        if node.type == 'GROUP_INPUT':
+            return ('INPUT', index)
+        if node.name in sub_groups:
+            sub_template, offset = sub_groups[node.name]
+            ref = sub_template.output_sources.get(index)
+            return shift(ref, node, offset) if ref else None
+        if node.name in node_specs:
+            return (node_specs[node.name], index)
+        return None
+
+    for link in node_tree.links:
+        to_node = link.to_node
+        if to_node.type != 'GROUP_OUTPUT' and to_node.name not in node_specs:
+            continue  # links into nested groups are part of their template
+        from_ref = get_source(link.from_node, socket_index(link.from_socket))
+        if not from_ref:
+            continue
+        index = socket_index(link.to_socket)
+        if to_node.type == 'GROUP_OUTPUT':
+            template.output_sources[index] = from_ref
+        else:
+            template.add_link(from_ref, (node_specs[to_node.name], index))
+
+    # links inside nested groups
+    for name, (sub_template, offset) in sub_groups.items():
+        group_node = node_tree.nodes[name]
+        for from_ref, to_ref in sub_template.links:
+            from_ref = shift(from_ref, group_node, offset)
+            if from_ref:
+                template.add_link(from_ref, (to_ref[0] + offset, to_ref[1]))
+
+    return template
+
+
+def instantiate_group_template(mat, group_node, template):
+    """replace group_node in mat with the nodes of template. returns new nodes"""
+    node_tree = mat.node_tree
+
+    # only nodes upstream of linked outputs are needed
+    used_outputs = [i for i, output in enumerate(group_node.outputs)
+                    if output.is_linked and i in template.output_sources]
+    needed = set()
+    stack = [template.output_sources[i] for i in used_outputs]
+    while stack:
+        ref = stack.pop()
+        if ref[0] == 'INPUT' or ref[0] in needed:
+            continue
+        needed.add(ref[0])
+        stack.extend(template.upstream.get(ref[0], []))
 
-    for group_node in group_nodes:
+    new_nodes = {}
+    for index in sorted(needed):
+        spec = template.specs[index]
+        if isinstance(spec, tuple):
+            node_type = "ShaderNodeValue" if spec[0] == 'VALUE' else "ShaderNodeRGB"
+            new_node = node_tree.nodes.new(type=node_type)
+            new_node.outputs[0].default_value = spec[1]
+        else:
+            new_node = duplicate_node(mat, spec)
+        new_nodes[index] = new_node
+
+    input_sockets = {}
+
+    def get_socket(ref):
+        if ref[0] != 'INPUT':
+            return new_nodes[ref[0]].outputs[ref[1]]
+        index = ref[1]
+        if index not in input_sockets:
+            input = group_node.inputs[index]
+            socket = None
+            if input.is_linked:
+                socket = input.links[0].from_socket
+            elif input.type in ['VALUE', 'RGBA']:
+                node_type = "ShaderNodeValue" if input.type == 'VALUE' else "ShaderNodeRGB"
+                val_node = node_tree.nodes.new(type=node_type)
+                val_node.outputs[0].default_value = input.default_value
+                new_nodes[('INPUT', index)] = val_node
+                socket = val_node.outputs[0]
+            input_sockets[index] = socket
+        return input_sockets[index]
+
+    for from_ref, (to_index, input_index) in template.links:
+        if to_index in needed:
+            from_socket = get_socket(from_ref)
+            if from_socket:
+                node_tree.links.new(
+                    from_socket, new_nodes[to_index].inputs[input_index])
+
+    for index in used_outputs:
+        from_socket = get_socket(template.output_sources[index])
+        if from_socket:
+            to_sockets = [link.to_socket for link in group_node.outputs[index].links]
+            for to_socket in to_sockets:
+                node_tree.links.new(from_socket, to_socket)
+
+    return list(new_nodes.values())
 
-        if group_node.type == 'GROUP':
-
-            # group_input_outputs
-            group_input_nodes = [
-                n for n in group_node.node_tree.nodes if n.type == 'GROUP_INPUT']
-            output_count = len(group_input_nodes[0].outputs)
-            group_input_outputs = [None] * output_count
-            for node in group_input_nodes:
-                for i in range(0, output_count):  # for input in node.inputs:
-                    output = node.outputs[i]
-                    if output.is_linked:
-                        group_input_outputs[i] = output
-
-            # group_output_inputs
-            group_output_nodes = [
-                n for n in group_node.node_tree.nodes if n.type == 'GROUP_OUTPUT']
-            input_count = len(group_output_nodes[0].inputs)
-            group_output_inputs = [None] * input_count
-            for node in group_output_nodes:
-                for i in range(0, input_count):  # for input in node.inputs:
-                    input = node.inputs[i]
-                    if input.is_linked:
-                        group_output_inputs[i] = input
-
-            # new value nodes
-            for index in range(0, output_count):
-                if group_input_outputs[index]:
-                    input = group_node.inputs[index]
-                    if not input.is_linked:
-                        val = group_node.inputs[index].default_value
-                        tmp_node = None
-                        if input.type == 'VALUE':
-                            tmp_node = mat.node_tree.nodes.new(
-                                type="ShaderNodeValue")
-                            tmp_node.outputs[0].default_value = val
-                        elif input.type == 'RGBA':
-                            tmp_node = mat.node_tree.nodes.new(
-                                type="ShaderNodeRGB")
-                            tmp_node.outputs[0].default_value = val
-                        if tmp_node:
-                            val_nodes.append(tmp_node)
-                            from_socket = tmp_node.outputs[0]
-                            to_socket = input
-                            mat.node_tree.links.new(from_socket, to_socket)
-
-            for output in group_node.outputs:
-                if output.is_linked:
-                    index = socket_index(output)
-                    input_socket = group_output_inputs[index]
-                    to_sockets = [
-                        link.to_socket for link in group_node.outputs[index].links]
-                    for link_to_socket in to_sockets:
-                        duplicate_from_input_socket(
-                            mat, input_socket, link_to_socket)
+
+def ungroup_nodes(mat, group_nodes):
+    """replace group nodes with their flattened content, nested groups included"""
+    new_nodes = []
+    for group_node in group_nodes:
+        if group_node.type == 'GROUP' and group_node.node_tree:
+            template = get_group_template(group_node.node_tree)
+            new_nodes.extend(
+                instantiate_group_template(mat, group_node, template))
 
             # delete group node
             mat.node_tree.nodes.remove(group_node)
 
-    # remove non linked value nodes
-    for node in val_nodes:
-        if not node.outputs[0].is_linked:
-            mat.node_tree.nodes.remove(node)
-            val_nodes.remove(node)
-
-    return list(new_nodes.values()) + val_nodes
+    return new_nodes
 
 
 def delete_tagged_nodes(material, tag):
@@ -1,5 +1,5 @@
 import bpy
-from bpy.props import BoolProperty, StringProperty
+from bpy.props import BoolProperty, FloatProperty, StringProperty
 from bpy.types import Operator, PropertyGroup, UIList
 
 from .pbaker_functions import *
@@ -95,6 +95,14 @@ class PBAKER_ListItem(PropertyGroup):
         default=False)
 
 
+class PBAKER_DirtyJob(PropertyGroup):
+    reason= StringProperty(name="Reason")
+
+
+class PBAKER_QueueItem(PropertyGroup):
+    eta= FloatProperty(name="ETA")
+
+
 class PBAKER_UL_List(UIList):
     def draw_item(self, context, layout, data, item, icon, active_data,
                   active_propname, index):
@@ -146,6 +154,7 @@ class PBAKER_BAKELIST_OT_Update(Operator):
         bakelist = context.scene.principled_baker_bakelist
 
         temp_joblist = get_joblist_from_objects(context.selected_objects)
+        clear_group_templates()
 
         for item_name, item in bakelist.items():
             if item_name in temp_joblist:
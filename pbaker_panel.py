@@ -90,6 +90,10 @@ class PBAKER_PT_BakeList(PBAKER_PT_SubPanel):
                           text="Indirect", toggle=True)
             row_diff.prop(self.render_settings, "use_pass_color",
                           text="Color", toggle=True)
+            row_comp = col.row(align=True)
+            row_comp.prop(self.settings, "use_diffuse_components", toggle=True)
+            if self.settings.use_diffuse_components:
+                row_comp.prop(self.settings, "diffuse_variants")
         if self.settings.bake_mode == 'SELECTED_TO_ACTIVE':
             col1.active = False
             row_diff.active = False
@@ -100,9 +104,21 @@ class PBAKER_PT_BakeList(PBAKER_PT_SubPanel):
         row.prop(self.settings, "use_invert_roughness")
         row.prop(self.settings, "suffix_glossiness", text="")
 
+        row = col2.row(align=True)
+        row.prop(self.settings, "normal_variants")
+        if self.settings.normal_variants:
+            row = col2.row(align=True)
+            row.prop(self.settings, "use_normal_renormalize", toggle=True)
+            row.prop(self.settings, "use_normal_reconstruct_z", toggle=True)
+
         row = col2.split()
         row.prop(self.settings, "use_Bump")
         row.prop(self.settings, "suffix_bump", text="")
+        if self.settings.use_Bump:
+            row = col2.row(align=True)
+            row.prop(self.settings, "use_normal_from_bump", toggle=True)
+            if self.settings.use_normal_from_bump:
+                row.prop(self.settings, "normal_from_bump_strength")
 
         row = col2.split()
         row.prop(self.settings, "use_vertex_color")
@@ -120,6 +136,18 @@ class PBAKER_PT_BakeList(PBAKER_PT_SubPanel):
             wf_row.prop(self.settings, "wireframe_size")
             wf_row.prop(self.settings, "use_pixel_size")
 
+        row = col2.split()
+        row.prop(self.settings, "use_curvature")
+        row.prop(self.settings, "suffix_curvature", text="")
+
+        row = col2.split()
+        row.prop(self.settings, "use_cavity")
+        row.prop(self.settings, "suffix_cavity", text="")
+        if self.settings.use_curvature or self.settings.use_cavity:
+            cv_row = col2.split()
+            cv_row.prop(self.settings, "curvature_strength")
+            cv_row.prop(self.settings, "curvature_radius")
+
 
 class PBAKER_PT_OutputSettings(PBAKER_PT_SubPanel):
     bl_parent_id = "PBAKER_PT_Main"
@@ -132,9 +160,23 @@ class PBAKER_PT_OutputSettings(PBAKER_PT_SubPanel):
         row.prop(self.settings, "resolution", expand=True)
         if self.settings.resolution == 'CUSTOM':
             col.prop(self.settings, "custom_resolution")
+        row = col.row(align=True)
+        row.prop(self.settings, "use_udim", toggle=True)
+        if self.settings.use_udim:
+            row.prop(self.settings, "use_udim_density", toggle=True)
         col.separator()
         col.prop(self.settings, "file_path")
         col.prop(self.settings, "use_overwrite")
+        col.prop(self.settings, "use_incremental")
+        if self.settings.use_incremental:
+            col.operator('object.principled_baker_check_changes',
+                         text='Check Changes')
+            dirty_jobs = context.scene.principled_baker_dirty_jobs
+            for item in dirty_jobs[:MAX_DIRTY_JOBS_SHOWN]:
+                col.label(text="{} ({})".format(item.name, item.reason))
+            if len(dirty_jobs) > MAX_DIRTY_JOBS_SHOWN:
+                col.label(text="... and {} more".format(
+                    len(dirty_jobs) - MAX_DIRTY_JOBS_SHOWN))
 
         col.separator()
 
@@ -151,6 +193,7 @@ class PBAKER_PT_OutputSettings(PBAKER_PT_SubPanel):
 
         if self.settings.file_format == 'OPEN_EXR':
             col.prop(self.settings, "exr_codec", text="Codec")
+            col.prop(self.settings, "use_exr_bundle")
 
         if self.settings.file_format == 'TIFF':
             col.prop(self.settings, "tiff_codec", text="Compression")
@@ -158,8 +201,27 @@ class PBAKER_PT_OutputSettings(PBAKER_PT_SubPanel):
         if self.settings.file_format == 'JPEG':
             col.prop(self.settings, "quality", text="Quality")
 
+        if self.settings.file_format == 'DDS':
+            col.prop(self.settings, "dds_quality", text="Compression")
+
+        if not (self.settings.file_format == 'OPEN_EXR' and self.settings.use_exr_bundle):
+            col.prop(self.settings, "use_mipmaps")
+
         col.separator()
         col.prop(self.settings, "samples")
+        col.prop(self.settings, "use_multiplex")
+        col.prop(self.settings, "use_bake_profile")
+        if self.settings.use_bake_profile:
+            col.prop(self.settings, "use_tile_calibration")
+        col.prop(self.settings, "use_isolation")
+        if self.settings.use_isolation:
+            col.prop(self.settings, "measure_isolation")
+        col.prop(self.settings, "use_denoise")
+        if self.settings.use_denoise:
+            row = col.row(align=True)
+            row.prop(self.settings, "denoise_radius")
+            row.prop(self.settings, "denoise_sigma")
+            col.prop(self.settings, "measure_denoise")
         col.prop(self.render_settings, "margin")
 
         # Alpha to Color
@@ -168,6 +230,15 @@ class PBAKER_PT_OutputSettings(PBAKER_PT_SubPanel):
         if self.settings.color_mode == 'RGB':
             col_alpha_to_col.active = False
 
+        # Uniform Images
+        col.separator()
+        col.prop(self.settings, "use_uniform_detection")
+        if self.settings.use_uniform_detection:
+            row = col.row()
+            row.prop(self.settings, "uniform_output", expand=True)
+            col.prop(self.settings, "uniform_tolerance")
+        col.prop(self.settings, "use_deduplication")
+
 
 class PBAKER_PT_SelectedToActiveSettings(PBAKER_PT_SubPanel):
     bl_parent_id = "PBAKER_PT_Main"
@@ -228,7 +299,7 @@ class PBAKER_PT_AutoUVUnwrap(PBAKER_PT_SubPanel):
     bl_label = "Auto UV unwrap"
 
     def draw(self, context):
-        if is_2_79 and self.settings.bake_mode == 'COMBINED':
+        if is_2_79 and self.settings.bake_mode in ['COMBINED', 'ATLAS']:
             self.layout.label(
                 text="Auto UV unwrap not available in Blender 2.79 for multiple objects.", icon='INFO')
         else:
@@ -298,12 +369,28 @@ class PBAKER_PT_Main(Panel):
             prefs = context.preferences.addons[__package__].preferences
 
         if bpy.context.scene.render.engine == 'CYCLES' or prefs.switch_to_cycles:
-            self.layout.operator('object.principled_baker_bake',
-                                 text='Bake', icon='RENDER_STILL')
+            row = self.layout.row(align=True)
+            row.operator('object.principled_baker_bake',
+                         text='Bake', icon='RENDER_STILL')
+            row.operator('object.principled_baker_bake_modal',
+                         text='Bake in Background', icon='TIME')
+            row.operator('object.principled_baker_bake_preview',
+                         text='Preview', icon='IMAGE_DATA')
         else:
             self.layout.label(text="Set Render engine to Cycles! {} is not supported.".format(
                 bpy.context.scene.render.engine), icon='ERROR')
 
+        # bake queue
+        queue_status = context.scene.principled_baker_queue_status
+        if queue_status:
+            col = self.layout.box().column(align=True)
+            col.label(text=queue_status)
+            for item in context.scene.principled_baker_queue:
+                col.label(text="{0} (ETA {1:.0f}s)".format(item.name, item.eta))
+            col.label(text="ESC: cancel, P: pause/resume")
+
         # bake mode
         self.layout.prop(self.settings, "bake_mode",
                          text="Bake Mode", expand=True)
+        if self.settings.bake_mode == 'ATLAS':
+            self.layout.prop(self.settings, "atlas_margin")
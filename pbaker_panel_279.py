@@ -29,16 +29,32 @@ class PBAKER_PT_panel(bpy.types.Panel):
             prefs = context.preferences.addons[__package__].preferences
 
         if bpy.context.scene.render.engine == 'CYCLES' or prefs.switch_to_cycles:
-            self.layout.operator('object.principled_baker_bake',
-                                 text='Bake', icon='RENDER_STILL')
+            row = self.layout.row(align=True)
+            row.operator('object.principled_baker_bake',
+                         text='Bake', icon='RENDER_STILL')
+            row.operator('object.principled_baker_bake_modal',
+                         text='Bake in Background', icon='TIME')
+            row.operator('object.principled_baker_bake_preview',
+                         text='Preview', icon='IMAGE_DATA')
         else:
             self.layout.label(text="Set Render engine to Cycles! {} is not supported.".format(
                 bpy.context.scene.render.engine), icon='ERROR')
 
+        # bake queue
+        queue_status = context.scene.principled_baker_queue_status
+        if queue_status:
+            col = self.layout.box().column(align=True)
+            col.label(text=queue_status)
+            for item in context.scene.principled_baker_queue:
+                col.label(text="{0} (ETA {1:.0f}s)".format(item.name, item.eta))
+            col.label(text="ESC: cancel, P: pause/resume")
+
         # bake mode
         col = self.layout.box().column(align=True)
         row = col.row()
         row.prop(settings, "bake_mode", text="Bake Mode", expand=True)
+        if settings.bake_mode == 'ATLAS':
+            col.prop(settings, "atlas_margin")
 
         # Autodetect
         col = self.layout.box().column(align=True)
@@ -101,6 +117,10 @@ class PBAKER_PT_panel(bpy.types.Panel):
                           text="Indirect", toggle=True)
             row_diff.prop(render_settings, "use_pass_color",
                           text="Color", toggle=True)
+            row_comp = col.row(align=True)
+            row_comp.prop(settings, "use_diffuse_components", toggle=True)
+            if settings.use_diffuse_components:
+                row_comp.prop(settings, "diffuse_variants")
         if settings.bake_mode == 'SELECTED_TO_ACTIVE':
             col1.active = False
             row_diff.active = False
@@ -111,9 +131,21 @@ class PBAKER_PT_panel(bpy.types.Panel):
         row.prop(settings, "use_invert_roughness")
         row.prop(settings, "suffix_glossiness", text="")
 
+        row = col2.row(align=True)
+        row.prop(settings, "normal_variants")
+        if settings.normal_variants:
+            row = col2.row(align=True)
+            row.prop(settings, "use_normal_renormalize", toggle=True)
+            row.prop(settings, "use_normal_reconstruct_z", toggle=True)
+
         row = col2.split()
         row.prop(settings, "use_Bump")
         row.prop(settings, "suffix_bump", text="")
+        if settings.use_Bump:
+            row = col2.row(align=True)
+            row.prop(settings, "use_normal_from_bump", toggle=True)
+            if settings.use_normal_from_bump:
+                row.prop(settings, "normal_from_bump_strength")
 
         row = col2.split()
         row.prop(settings, "use_vertex_color")
@@ -131,15 +163,41 @@ class PBAKER_PT_panel(bpy.types.Panel):
             wf_row.prop(settings, "wireframe_size")
             wf_row.prop(settings, "use_pixel_size")
 
+        row = col2.split()
+        row.prop(settings, "use_curvature")
+        row.prop(settings, "suffix_curvature", text="")
+
+        row = col2.split()
+        row.prop(settings, "use_cavity")
+        row.prop(settings, "suffix_cavity", text="")
+        if settings.use_curvature or settings.use_cavity:
+            cv_row = col2.split()
+            cv_row.prop(settings, "curvature_strength")
+            cv_row.prop(settings, "curvature_radius")
+
         # output options:
         col = self.layout.box().column(align=True)
         row = col.row()
         row.prop(settings, "resolution", expand=True)
         if settings.resolution == 'CUSTOM':
             col.prop(settings, "custom_resolution")
+        row = col.row(align=True)
+        row.prop(settings, "use_udim", toggle=True)
+        if settings.use_udim:
+            row.prop(settings, "use_udim_density", toggle=True)
         col.separator()
         col.prop(settings, "file_path")
         col.prop(settings, "use_overwrite")
+        col.prop(settings, "use_incremental")
+        if settings.use_incremental:
+            col.operator('object.principled_baker_check_changes',
+                         text='Check Changes')
+            dirty_jobs = context.scene.principled_baker_dirty_jobs
+            for item in dirty_jobs[:MAX_DIRTY_JOBS_SHOWN]:
+                col.label(text="{} ({})".format(item.name, item.reason))
+            if len(dirty_jobs) > MAX_DIRTY_JOBS_SHOWN:
+                col.label(text="... and {} more".format(
+                    len(dirty_jobs) - MAX_DIRTY_JOBS_SHOWN))
 
         col.separator()
 
@@ -156,6 +214,7 @@ class PBAKER_PT_panel(bpy.types.Panel):
 
         if settings.file_format == 'OPEN_EXR':
             col.prop(settings, "exr_codec", text="Codec")
+            col.prop(settings, "use_exr_bundle")
 
         if settings.file_format == 'TIFF':
             col.prop(settings, "tiff_codec", text="Compression")
@@ -163,8 +222,27 @@ class PBAKER_PT_panel(bpy.types.Panel):
         if settings.file_format == 'JPEG':
             col.prop(settings, "quality", text="Quality")
 
+        if settings.file_format == 'DDS':
+            col.prop(settings, "dds_quality", text="Compression")
+
+        if not (settings.file_format == 'OPEN_EXR' and settings.use_exr_bundle):
+            col.prop(settings, "use_mipmaps")
+
         col.separator()
         col.prop(settings, "samples")
+        col.prop(settings, "use_multiplex")
+        col.prop(settings, "use_bake_profile")
+        if settings.use_bake_profile:
+            col.prop(settings, "use_tile_calibration")
+        col.prop(settings, "use_isolation")
+        if settings.use_isolation:
+            col.prop(settings, "measure_isolation")
+        col.prop(settings, "use_denoise")
+        if settings.use_denoise:
+            row = col.row(align=True)
+            row.prop(settings, "denoise_radius")
+            row.prop(settings, "denoise_sigma")
+            col.prop(settings, "measure_denoise")
         col.prop(render_settings, "margin")
 
         # Alpha to Color
@@ -173,6 +251,15 @@ class PBAKER_PT_panel(bpy.types.Panel):
         if settings.color_mode == 'RGB':
             col_alpha_to_col.active = False
 
+        # Uniform Images
+        col.separator()
+        col.prop(settings, "use_uniform_detection")
+        if settings.use_uniform_detection:
+            row = col.row()
+            row.prop(settings, "uniform_output", expand=True)
+            col.prop(settings, "uniform_tolerance")
+        col.prop(settings, "use_deduplication")
+
 
         col2 = self.layout.box().column(align=True)
         col2.label(text="Selected to Active:")
@@ -210,7 +297,7 @@ class PBAKER_PT_panel(bpy.types.Panel):
         row.prop(settings, "auto_smooth", text="Auto Smooth", expand=True)
 
         # Auto UV unwrap
-        if is_2_79 and settings.bake_mode == 'COMBINED':
+        if is_2_79 and settings.bake_mode in ['COMBINED', 'ATLAS']:
             self.layout.label(
                 text="Auto UV unwrap not available in Blender 2.79 for multiple objects.", icon='INFO')
         else:
@@ -3,9 +3,11 @@ from bpy.props import (BoolProperty, EnumProperty, FloatProperty, IntProperty,
                        PointerProperty, StringProperty)
 from bpy.types import AddonPreferences, Operator, Panel, PropertyGroup
 
+from .pbaker_functions import MANIFEST_FILE_NAME
+
 
 def color_mode_items(scene, context):
-    if scene.file_format in ['PNG', 'TARGA', 'TIFF', 'OPEN_EXR']:
+    if scene.file_format in ['PNG', 'TARGA', 'TIFF', 'OPEN_EXR', 'DDS']:
         items = [
             ('RGB', "RGB", ""),
             ('RGBA', "RGBA", ""),
@@ -44,6 +46,7 @@ class PBAKER_settings(bpy.types.PropertyGroup):
             ('TIFF', 'TIFF', ''),
             ('TARGA', 'Targa', ''),
             ('OPEN_EXR', 'OpenEXR', ''),
+            ('DDS', 'DDS', 'Block compressed textures: BC1/BC3 for colors, BC4 for grayscale maps, BC5 for normal maps'),
         ),
         default='PNG'
     )
@@ -81,6 +84,28 @@ class PBAKER_settings(bpy.types.PropertyGroup):
         default='ZIP'
     )
 
+    use_exr_bundle= BoolProperty(
+        name="Multi-Layer EXR",
+        description="Write all textures of an object as layers of one multi-part EXR instead of one file per texture. Textures of the new material are packed",
+        default=False
+    )
+
+    use_mipmaps= BoolProperty(
+        name="Mipmaps",
+        description="Write a mipmap chain for each texture. Embedded in DDS, as <name>_mip<level> files for other formats. sRGB textures are averaged in linear space, normal maps renormalized and alpha maps keep their coverage",
+        default=False
+    )
+
+    dds_quality= EnumProperty(
+        name="Compression",
+        description="Search for the block endpoints",
+        items=(
+            ('FAST', 'Fast', 'Range of each block'),
+            ('QUALITY', 'Quality', 'Principal axis of each block, refined by least squares'),
+        ),
+        default='FAST'
+    )
+
     tiff_codec= EnumProperty(
         name="Compression",
         items=(
@@ -130,6 +155,18 @@ class PBAKER_settings(bpy.types.PropertyGroup):
         default='1024'
     )
 
+    use_udim= BoolProperty(
+        name="UDIM Tiles",
+        description="Bake each UDIM tile touched by the UV map to <name>.<tile>.<ext>. Empty tiles are skipped.\nDerived outputs (Glossiness, Normal from Bump, Curvature, Denoise, ...) are not created",
+        default=False
+    )
+
+    use_udim_density= BoolProperty(
+        name="Resolution by Area",
+        description="Lower resolution (power of 2 fractions) for tiles with less surface area than the largest tile",
+        default=False
+    )
+
     margin= IntProperty(
         name="Margin",
         default=0,
@@ -143,12 +180,101 @@ class PBAKER_settings(bpy.types.PropertyGroup):
         min=1
     )
 
+    use_multiplex= BoolProperty(
+        name="Multiplex Grayscale Bakes",
+        description="Bake up to three grayscale inputs (Metallic, Roughness, ...) in one pass to R, G and B and split them afterwards",
+        default=False
+    )
+
     use_overwrite= BoolProperty(
         name="Overwrite",
         description="Be careful with Overwrite! It does what it says!",
         default=False
     )
 
+    use_incremental= BoolProperty(
+        name="Only Changed",
+        description="Bake only missing textures and textures with changed materials, meshes or settings.\nFingerprints are stored in {}".format(
+            MANIFEST_FILE_NAME),
+        default=False
+    )
+
+    use_uniform_detection= BoolProperty(
+        name="Detect Uniform Images",
+        description="Replace baked images with only one color by an input value or a 1x1 image",
+        default=False
+    )
+    uniform_tolerance= FloatProperty(
+        name="Tolerance",
+        description="Maximum difference of pixel values in a uniform image",
+        default=0.005,
+        min=0.0,
+        max=1.0,
+        precision=3
+    )
+    uniform_output= EnumProperty(
+        name="Uniform Images",
+        items=(
+            ('VALUE', 'Value', 'Set input value in new material, if possible. No image will be saved'),
+            ('IMAGE', '1x1 Image', 'Save image with a single pixel'),
+        ),
+        default='VALUE'
+    )
+
+    use_bake_profile= BoolProperty(
+        name="Optimize Threads/Tiles",
+        description="Use a number of threads and a tile size suited to bake resolution and device while baking",
+        default=False
+    )
+    use_tile_calibration= BoolProperty(
+        name="Calibrate Threads/Tiles",
+        description="Benchmark tile sizes and thread counts once per device and resolution and remember the fastest on this machine",
+        default=False
+    )
+
+    use_isolation= BoolProperty(
+        name="Isolate Bake Objects",
+        description="Hide all other objects from rendering while baking, so Cycles only syncs the objects to bake. Not used for Diffuse and Ambient Occlusion",
+        default=False
+    )
+    measure_isolation= BoolProperty(
+        name="Measure Isolation",
+        description="Bake the first job with and without isolation and report the time saved",
+        default=False
+    )
+
+    use_denoise= BoolProperty(
+        name="Denoise AO/Diffuse",
+        description="Edge-aware denoising of Ambient Occlusion and Diffuse, guided by the baked Normal, inside of UV islands. Allows fewer samples",
+        default=False
+    )
+    denoise_radius= IntProperty(
+        name="Radius",
+        description="Filter radius in pixels",
+        default=3,
+        min=1,
+        soft_max=8
+    )
+    denoise_sigma= FloatProperty(
+        name="Color Sigma",
+        description="Color differences much larger than this are kept as edges",
+        default=0.1,
+        min=0.001,
+        soft_max=1.0
+    )
+    measure_denoise= BoolProperty(
+        name="Measure Denoise",
+        description="Bake the first AO/Diffuse job with 1/4, 1/2 and all samples and report the error with and without denoising against 4x samples",
+        default=False
+    )
+
+    use_deduplication= BoolProperty(
+        name="Deduplicate Images",
+        description="Save identical images only once. Duplicates are listed as aliases in {}".format(
+            MANIFEST_FILE_NAME),
+        default=False
+    )
+
     use_alpha= BoolProperty(
         name="Image Alpha",
         default=False
@@ -186,6 +312,29 @@ class PBAKER_settings(bpy.types.PropertyGroup):
         default=False
     )
 
+    normal_variants= EnumProperty(
+        name="Normal Variants",
+        description="Normal maps in other conventions, converted from the baked ones without rebaking",
+        options={'ENUM_FLAG'},
+        items=(
+            ('OPENGL', 'OpenGL', 'Y+, suffix _GL'),
+            ('DIRECTX', 'DirectX', 'Y-, suffix _DX'),
+        ),
+        default=set()
+    )
+
+    use_normal_renormalize= BoolProperty(
+        name="Renormalize",
+        description="Normalize the vectors of normal variants",
+        default=True
+    )
+
+    use_normal_reconstruct_z= BoolProperty(
+        name="Reconstruct Z",
+        description="Z of normal variants from X and Y, as read from two channel storage (BC5)",
+        default=False
+    )
+
     suffix_normal= StringProperty(
         name="Normal",
         default="_normal",
@@ -222,6 +371,18 @@ class PBAKER_settings(bpy.types.PropertyGroup):
         maxlen=1024,
     )
 
+    suffix_curvature= StringProperty(
+        name="Curvature",
+        default="_curvature",
+        maxlen=1024,
+    )
+
+    suffix_cavity= StringProperty(
+        name="Cavity",
+        default="_cavity",
+        maxlen=1024,
+    )
+
     image_prefix= StringProperty(
         name="Prefix (Texture Name)",
         description="Object name will be used as prefix, if Prefix not set",
@@ -258,10 +419,19 @@ class PBAKER_settings(bpy.types.PropertyGroup):
             ('COMBINED', 'Combined', 'Bake a single selected object or bake multiple objects with shared UV maps.\n(like Blenders default bake)'),
             ('BATCH', 'Single/Batch', 'Bake every selected object separately.'),
             ('SELECTED_TO_ACTIVE', 'Selected to Active', ''),
+            ('ATLAS', 'Atlas', 'Pack the UV islands of all selected objects into one new UV map and bake them to one shared texture set and material'),
         ),
         default='COMBINED'
     )
 
+    atlas_margin= IntProperty(
+        name="Margin",
+        description="Gap between packed UV islands in pixels",
+        default=4,
+        min=0,
+        soft_max=64
+    )
+
     make_new_material= BoolProperty(
         name="Create New Material",
         description="Create new materials",
@@ -401,6 +571,20 @@ class PBAKER_settings(bpy.types.PropertyGroup):
 
     use_Bump= BoolProperty(name="Bump (Height)", default=False)
 
+    use_normal_from_bump= BoolProperty(
+        name="Normal from Bump",
+        description="Compute Normal from the baked Bump height instead of baking it. Use, if the only normal detail comes from a Bump node",
+        default=False
+    )
+
+    normal_from_bump_strength= FloatProperty(
+        name="Strength",
+        description="Height of the Bump map in UV space, like Distance of a Bump node",
+        default=0.1,
+        min=0.0,
+        soft_max=1.0
+    )
+
     use_vertex_color= BoolProperty(name="Vertex Color", default=False)
 
     use_material_id= BoolProperty(name="Material ID", default=False)
@@ -410,6 +594,21 @@ class PBAKER_settings(bpy.types.PropertyGroup):
         name="Diffuse",
         description='Does only work in "Combined" and "Single/Batch"',
         default=False)
+    use_diffuse_components= BoolProperty(
+        name="Components",
+        description="Bake Direct, Indirect and Color once each and compose Diffuse and its variants from them. The components are saved too",
+        default=False)
+    diffuse_variants= EnumProperty(
+        name="Diffuse Variants",
+        description="Additional combinations, composed from the components without rebaking",
+        options={'ENUM_FLAG'},
+        items=(
+            ('LIT', 'Lit', '(Direct + Indirect) * Color, suffix _Lit'),
+            ('UNLIT', 'Unlit', 'Color only, suffix _Unlit'),
+            ('LIGHTING', 'Lighting', 'Direct + Indirect, suffix _Lighting'),
+        ),
+        default=set()
+    )
 
     select_uv_map= EnumProperty(
         name="UV Map",
@@ -459,3 +658,28 @@ class PBAKER_settings(bpy.types.PropertyGroup):
         # max=100.0,
         soft_max=100.0
     )
+
+    use_curvature= BoolProperty(
+        name="Curvature",
+        description="Curvature from the baked Normal, no extra bake",
+        default=False)
+
+    use_cavity= BoolProperty(
+        name="Cavity",
+        description="Cavity from the baked Normal, no extra bake",
+        default=False)
+
+    curvature_strength= FloatProperty(
+        name="Strength",
+        default=1.0,
+        min=0.0,
+        soft_max=10.0
+    )
+
+    curvature_radius= IntProperty(
+        name="Blur",
+        description="Blur radius in pixels. Not across UV island borders",
+        default=1,
+        min=0,
+        soft_max=16
+    )
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+OpenEXR = pytest.importorskip("OpenEXR")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pbaker_exr import MultiPartExrLayer, MultiPartExrWriter  # noqa: E402
+
+RGBA = [('R', 0), ('G', 1), ('B', 2), ('A', 3)]
+RGB = [('R', 0), ('G', 1), ('B', 2)]
+
+
+def write_exr(file_path, images, pixel_type, compression):
+    """images: [(name, width, height, channels, pixels bottom row first)]"""
+    layers = [MultiPartExrLayer(name, width, height, channels)
+              for name, width, height, channels, pixels in images]
+    writer = MultiPartExrWriter(file_path, layers, pixel_type, compression)
+    for index, image in enumerate(images):
+        writer.write_layer(index, image[4])
+    writer.close()
+
+
+@pytest.mark.parametrize("pixel_type", ['HALF', 'FLOAT'])
+@pytest.mark.parametrize("compression", ['NONE', 'ZIPS', 'ZIP'])
+def test_parts_of_different_size(tmp_path, pixel_type, compression):
+    rng = numpy.random.default_rng(0)
+    images = [
+        ("Color", 37, 21, RGBA, rng.random((37 * 21, 4)).astype(numpy.float32)),
+        # collapsed uniform image
+        ("Metallic", 1, 1, RGB, numpy.array([[0.25, 0.5, 0.75, 1.0]], dtype=numpy.float32)),
+        ("Roughness", 16, 40, RGB, rng.random((16 * 40, 4)).astype(numpy.float32)),
+    ]
+    file_path = str(tmp_path / "bundle.exr")
+    write_exr(file_path, images, pixel_type, compression)
+
+    exr = OpenEXR.File(file_path, separate_channels=True)
+    assert [part.name() for part in exr.parts] == [image[0] for image in images]
+
+    tolerance = 1e-3 if pixel_type == 'HALF' else 0.0
+    for part, (name, width, height, channels, pixels) in zip(exr.parts, images):
+        low, high = part.header['displayWindow']
+        assert (low.tolist(), high.tolist()) == ([0, 0], [36, 39])
+        low, high = part.header['dataWindow']
+        assert (low.tolist(), high.tolist()) == ([0, 0], [width - 1, height - 1])
+
+        assert sorted(part.channels) == sorted("{}.{}".format(name, c) for c, i in channels)
+        for c, i in channels:
+            # EXR is stored top row first
+            values = part.channels["{}.{}".format(name, c)].pixels[::-1].reshape(-1)
+            assert numpy.abs(values.astype(numpy.float32) - pixels[:, i]).max() <= tolerance
+
+
+def test_long_names(tmp_path):
+    name = "Translucent_Alpha_with_a_very_long_layer_name"
+    pixels = numpy.full((4 * 4, 4), 0.5, dtype=numpy.float32)
+    file_path = str(tmp_path / "long.exr")
+    write_exr(file_path, [(name, 4, 4, RGB, pixels), ("Alpha", 2, 2, RGB, pixels[:4])],
+              'FLOAT', 'ZIP')
+
+    exr = OpenEXR.File(file_path, separate_channels=True)
+    assert exr.parts[0].name() == name
+    assert numpy.all(exr.parts[0].channels[name + ".R"].pixels == 0.5)
@@ -0,0 +1,59 @@
+import importlib
+import os
+import sys
+import types
+
+import numpy
+import pytest
+
+# pbaker_functions needs Blender's bpy
+pytest.importorskip("bpy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "pbaker" not in sys.modules:
+    package = types.ModuleType("pbaker")
+    package.__path__ = [ROOT]
+    sys.modules["pbaker"] = package
+pbaker_functions = importlib.import_module("pbaker.pbaker_functions")
+
+
+def box_filtered_chain(rows):
+    levels = []
+    level = rows
+    while level.shape[0] > 1 or level.shape[1] > 1:
+        level = pbaker_functions.get_half_size(level)
+        levels.append(level)
+    return levels
+
+
+@pytest.mark.parametrize("job_name", ['Color', 'Alpha'])
+def test_opaque_alpha(job_name):
+    rows = numpy.ones((8, 8, 4), dtype=numpy.float32)
+    for mip in pbaker_functions.get_mip_chain(rows, job_name):
+        assert numpy.all(mip == 1.0)
+
+
+@pytest.mark.parametrize("job_name", ['Color', 'Alpha'])
+def test_binary_alpha(job_name):
+    rows = numpy.ones((8, 8, 4), dtype=numpy.float32)
+    rows[:, 4:] = 0.0
+    if job_name == 'Color':
+        rows[:, :, 0:3] = 0.5
+    levels = pbaker_functions.get_mip_chain(rows, job_name)
+    expected = box_filtered_chain(rows)
+    assert len(levels) == len(expected) == 3
+    for mip, box in zip(levels, expected):
+        assert numpy.array_equal(mip, box)
+
+
+def test_coverage_is_kept():
+    # 2x2 blocks with 3 pixels of 0.6 fade below the cutoff in box filtered mips
+    rows = numpy.zeros((8, 8, 4), dtype=numpy.float32)
+    rows[0:2, :, 3] = 0.6
+    rows[0, 1::2, 3] = 0.0
+    rows[2:4, :, 3] = 1.0
+    coverage = pbaker_functions.get_coverage(rows[:, :, 3], 0.5)
+    mip = pbaker_functions.get_mip_chain(rows, 'Color')[0]
+    assert pbaker_functions.get_coverage(box_filtered_chain(rows)[0][:, :, 3], 0.5) == 0.25
+    assert coverage == 0.4375
+    assert pbaker_functions.get_coverage(mip[:, :, 3], 0.5) == 0.5